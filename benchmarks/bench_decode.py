@@ -0,0 +1,51 @@
+"""Микробенчмарк декодирования ответов WB на фикстурах benchmarks/fixtures (формат ответов search.wb.ru, card.wb.ru и card.json).
+
+Запуск: PYTHONPATH=src python benchmarks/bench_decode.py [--number N]
+Печатает JSON со временем на одну операцию (мс) и пиком выделенной памяти.
+"""
+import argparse
+import json
+import os
+import timeit
+import tracemalloc
+from parser.decode import JSON_BACKEND, parse_card
+from parser.pages import parse_search_page
+from parser.api import parse_price_response
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+def measure(func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms_per_op": round(seconds * 1000, 4), "peak_kb": round(peak / 1024, 1)}
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--number", type=int, default=200, help="Повторов в одном замере")
+    args = arg_parser.parse_args()
+
+    search_raw = load_fixture("search_page.json")
+    card_raw = load_fixture("card.json")
+    prices_raw = load_fixture("prices.json")
+    cases = {
+        "search_page/json_full": lambda: [p.get("id") for p in json.loads(search_raw)["data"]["products"]],
+        "search_page/parse_search_page": lambda: parse_search_page(search_raw),
+        "card/json_full": lambda: json.loads(card_raw),
+        "card/parse_card": lambda: parse_card(card_raw),
+        "prices/json_full": lambda: json.loads(prices_raw),
+        "prices/parse_price_response": lambda: parse_price_response(prices_raw),
+    }
+    results = {name: measure(func, args.number) for name, func in cases.items()}
+    print(json.dumps({"backend": JSON_BACKEND, "payload_bytes": {
+        "search_page": len(search_raw), "card": len(card_raw), "prices": len(prices_raw)
+    }, "results": results}, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""Сценарные бенчмарки парсера против локальной замены Wildberries (benchmarks/fake_wb.py).
+
+Сценарии:
+    import_time    - время импорта parser.search и parser.parser в новом процессе, без aiogram и pymorphy2
+    single_card    - get_product_info для разных артикулов по очереди (карточка, корзина, цены, ключевые слова)
+    keywords       - extract_keywords_manual на холодном и теплом кэше лемм
+    search_miss    - search_product_by_keywords, товар не найден за 100 страниц
+    concurrent_chats - N чатов одновременно: карточка и поиск по первым ключевым словам
+
+Запуск: PYTHONPATH=src python benchmarks/bench_scenarios.py --latency 0.02 --chats 20 > bench.json
+Печатает JSON: для каждого сценария число операций, ops/s, запросы к фейку,
+p50/p95/p99 задержки (мс) и пиковый RSS процесса (МБ).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src")
+SCENARIOS = ["import_time", "single_card", "keywords", "search_miss", "concurrent_chats"]
+
+# Артикулы с vol=1206: корзина известна по статической таблице, карточки разные
+BASE_NM_ID = 120600000
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values, q):
+    """Перцентиль по ближайшему рангу."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def peak_rss_mb():
+    # ru_maxrss - килобайты в Linux, байты в macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def summarize(latencies, errors, seconds, upstream=None, extra=None):
+    ops = len(latencies) + errors
+    result = {
+        "ops": ops,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "ops_per_s": round(ops / seconds, 2) if seconds else None,
+        "latency_ms": {
+            name: round(value * 1000, 2) if value is not None else None
+            for name, value in (("p50", percentile(latencies, 0.5)), ("p95", percentile(latencies, 0.95)),
+                                ("p99", percentile(latencies, 0.99)), ("max", max(latencies, default=None)))
+        },
+        "peak_rss_mb": peak_rss_mb()
+    }
+    if upstream is not None:
+        result["upstream"] = dict(upstream, req_per_s=round(upstream["requests"] / seconds, 2) if seconds else None)
+    if extra:
+        result.update(extra)
+    return result
+
+class FakeServer:
+    """fake_wb.py в отдельном процессе, чтобы сервер не делил CPU и память с замеряемым кодом."""
+
+    def __init__(self, args):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        command = [
+            sys.executable, os.path.join(BENCH_DIR, "fake_wb.py"), "--port", str(self.port),
+            "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+            "--throttle-rate", str(args.throttle_rate), "--total", str(args.total), "--seed", str(args.seed)
+        ]
+        if args.retry_after is not None:
+            command += ["--retry-after", str(args.retry_after)]
+        env = dict(os.environ, LOG_DIR="", LOG_LEVEL="WARNING", PYTHONPATH=SRC_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        self.process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                self.stats()
+                break
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("fake_wb.py did not start")
+                time.sleep(0.1)
+
+    def _call(self, path, method="GET"):
+        request = urllib.request.Request(self.base_url + path, method=method)
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())
+
+    def stats(self):
+        return self._call("/_stats")
+
+    def reset(self):
+        return self._call("/_reset", method="POST")
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+def configure_env(base_url, workdir, args):
+    """Переменные окружения парсера: адреса фейка, без дискового кэша и без лимитов скорости."""
+    env = {
+        "BASKET_BASE_URL": base_url + "/{basket}",
+        "PRICE_BASE_URL": base_url + "/prices?appType=1",
+        "SEARCH_BASE_URL": base_url + "/search?appType=1",
+        "RATE_LIMITS": "127.0.0.1=100000",
+        "RATE_LIMIT_MAX": "100000",
+        "CACHE_DB_FILE": "",
+        "BASKET_MAP_FILE": os.path.join(workdir, "basket_map.json"),
+        "LOG_DIR": "",
+        "LOG_LEVEL": args.log_level,
+        "USE_AI": "false",
+        "KEYWORD_WORKERS": str(args.keyword_workers),
+        "PYTHONPATH": SRC_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""),
+    }
+    os.environ.update(env)
+    return dict(os.environ)
+
+def bench_import_time(args, env):
+    code = (
+        "import sys, time; start = time.perf_counter(); import parser.search, parser.parser; "
+        "print(time.perf_counter() - start, 'aiogram' in sys.modules, 'pymorphy2' in sys.modules)"
+    )
+    latencies, heavy = [], set()
+    start = time.perf_counter()
+    for _ in range(args.import_runs):
+        output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout.split()
+        latencies.append(float(output[0]))
+        if output[1] == "True":
+            heavy.add("aiogram")
+        if output[2] == "True":
+            heavy.add("pymorphy2")
+    return summarize(latencies, 0, time.perf_counter() - start, extra={"heavy_modules_imported": sorted(heavy)})
+
+async def timed(coro_factory):
+    start = time.perf_counter()
+    result = await coro_factory()
+    return time.perf_counter() - start, result
+
+async def run_ops(factories, concurrency, is_error=lambda result: False):
+    """Выполняет корутины не более concurrency одновременно; возвращает (задержки, ошибки, секунды)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def run_one(factory):
+        nonlocal errors
+        async with semaphore:
+            try:
+                elapsed, result = await timed(factory)
+            except Exception:
+                errors += 1
+                return
+            if is_error(result):
+                errors += 1
+            else:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_one(factory) for factory in factories))
+    return latencies, errors, time.perf_counter() - start
+
+async def bench_single_card(args, fake):
+    from parser.parser import get_product_info
+    fake.reset()
+    factories = [
+        (lambda nm_id=nm_id: get_product_info(f"https://www.wildberries.ru/catalog/{nm_id}/detail.aspx"))
+        for nm_id in range(BASE_NM_ID, BASE_NM_ID + args.iterations)
+    ]
+    latencies, errors, seconds = await run_ops(factories, 1, is_error=lambda info: "error" in info)
+    return summarize(latencies, errors, seconds, fake.stats())
+
+def bench_keywords(args):
+    from parser.keywords import extract_keywords_manual
+    from parser.morph import clear_lemma_cache, warm_up
+    from parser.decode import parse_card
+    with open(os.path.join(BENCH_DIR, "fixtures", "card.json"), "rb") as f:
+        card = parse_card(f.read())
+    title = card.get("imt_name", "")
+
+    start = time.perf_counter()
+    warm_up()
+    morph_load = time.perf_counter() - start
+
+    result = {"morph_load_seconds": round(morph_load, 3)}
+    for name, clear in (("cold", True), ("warm", False)):
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            if clear:
+                clear_lemma_cache()
+            op_start = time.perf_counter()
+            extract_keywords_manual(card, title)
+            latencies.append(time.perf_counter() - op_start)
+        result[name] = summarize(latencies, 0, time.perf_counter() - start)
+    return result
+
+async def bench_search_miss(args, fake):
+    from parser.search import search_product_by_keywords
+    fake.reset()
+    # Уникальный запрос на каждую операцию: кэш страниц и снимки выдачи не помогают
+    factories = [
+        (lambda idx=idx: search_product_by_keywords(BASE_NM_ID, f"bench miss {args.seed} {idx}"))
+        for idx in range(args.search_iterations)
+    ]
+    latencies, errors, seconds = await run_ops(factories, 1, is_error=lambda result: result is None)
+    return summarize(latencies, errors, seconds, fake.stats(), extra={"pages_per_op": -(-args.total // 100)})
+
+async def bench_concurrent_chats(args, fake):
+    from parser.parser import get_product_info
+    from parser.search import search_keywords
+    fake.reset()
+
+    async def chat(nm_id):
+        info = await get_product_info(f"https://www.wildberries.ru/catalog/{nm_id}/detail.aspx")
+        if "error" in info:
+            return info
+        await search_keywords(nm_id, info["keywords"][:args.chat_keywords])
+        return info
+
+    # Другие артикулы, чем в single_card, чтобы карточки не брались из кэша
+    first = BASE_NM_ID + 50000
+    factories = [(lambda nm_id=nm_id: chat(nm_id)) for nm_id in range(first, first + args.chats)]
+    latencies, errors, seconds = await run_ops(factories, args.chats, is_error=lambda info: "error" in info)
+    return summarize(latencies, errors, seconds, fake.stats(), extra={"chats": args.chats})
+
+async def run_async_scenarios(args, fake, scenarios):
+    from parser.executor import start_pool, shutdown_pool
+    from parser.http import close_session
+    from parser.ratelimit import reset_limiters
+    results = {}
+    if {"single_card", "concurrent_chats"} & set(scenarios):
+        try:
+            await start_pool()
+        except Exception as e:
+            results["pool_error"] = repr(e)
+    runners = {"single_card": bench_single_card, "search_miss": bench_search_miss, "concurrent_chats": bench_concurrent_chats}
+    try:
+        for name in scenarios:
+            if name in runners:
+                # Снижения скорости после 429/5xx в одном сценарии не должны влиять на следующий
+                reset_limiters()
+                try:
+                    results[name] = await runners[name](args, fake)
+                except Exception as e:
+                    results[name] = {"error": repr(e)}
+    finally:
+        shutdown_pool()
+        await close_session()
+    return results
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Сценарии через запятую")
+    arg_parser.add_argument("--iterations", type=int, default=20, help="Операций в single_card и keywords")
+    arg_parser.add_argument("--search-iterations", type=int, default=5, help="Поисков в search_miss")
+    arg_parser.add_argument("--chats", type=int, default=10, help="Одновременных чатов в concurrent_chats")
+    arg_parser.add_argument("--chat-keywords", type=int, default=3, help="Ключевых слов на чат")
+    arg_parser.add_argument("--import-runs", type=int, default=5)
+    arg_parser.add_argument("--keyword-workers", type=int, default=0, help="KEYWORD_WORKERS для парсера")
+    arg_parser.add_argument("--latency", type=float, default=0.01, help="Задержка фейка, секунды")
+    arg_parser.add_argument("--jitter", type=float, default=0.0)
+    arg_parser.add_argument("--error-rate", type=float, default=0.0)
+    arg_parser.add_argument("--throttle-rate", type=float, default=0.0)
+    arg_parser.add_argument("--retry-after", type=float)
+    arg_parser.add_argument("--total", type=int, default=10000, help="Товаров в выдаче (10000 - 100 страниц)")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--log-level", default="WARNING")
+    arg_parser.add_argument("--output", help="Записать JSON в файл вместо stdout")
+    args = arg_parser.parse_args()
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        arg_parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        fake = FakeServer(args)
+        try:
+            env = configure_env(fake.base_url, workdir, args)
+            sys.path.insert(0, SRC_DIR)
+            results = {}
+            if "import_time" in scenarios:
+                results["import_time"] = bench_import_time(args, env)
+            results.update(asyncio.run(run_async_scenarios(args, fake, scenarios)))
+            if "keywords" in scenarios:
+                try:
+                    results["keywords"] = bench_keywords(args)
+                except Exception as e:
+                    results["keywords"] = {"error": repr(e)}
+        finally:
+            fake.stop()
+
+    report = {
+        "python": sys.version.split()[0],
+        "config": {name: getattr(args, name) for name in ("latency", "jitter", "error_rate", "throttle_rate", "total", "seed", "keyword_workers")},
+        "scenarios": {name: results[name] for name in scenarios if name in results},
+        "peak_rss_mb": peak_rss_mb()
+    }
+    if "pool_error" in results:
+        report["pool_error"] = results["pool_error"]
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
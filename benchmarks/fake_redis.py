@@ -0,0 +1,117 @@
+"""Локальная замена Redis для проверки общего хранилища состояния (parser/state.py) без настоящего сервера.
+
+Поддерживает только команды, которые использует RedisBackend: PING, AUTH,
+SELECT, GET, SET (EX/PX/NX/XX), DEL и EVAL со скриптами снятия и продления блокировки.
+Адрес для бота: STATE_BACKEND_URL=redis://127.0.0.1:PORT/0
+
+Запуск: PYTHONPATH=src python benchmarks/fake_redis.py --port 6390 --latency 0.001
+"""
+import argparse
+import asyncio
+import time
+from parser.state import RELEASE_SCRIPT, RENEW_SCRIPT, read_reply
+
+def encode_reply(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, PermissionError):
+        return b"-%s\r\n" % str(value).encode()
+    if isinstance(value, Exception):
+        return b"-ERR %s\r\n" % str(value).encode()
+    if value == "OK":
+        return b"+OK\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+class FakeRedis:
+    def __init__(self, latency=0.0, password=None):
+        self.latency = latency
+        self.password = password
+        self._data = {}  # key -> (value, expires_at или None)
+        self.commands = 0
+
+    def _get(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry[0] if entry is not None else None
+
+    def execute(self, args, session):
+        """Выполняет команду; session - состояние соединения ({"authenticated": bool})."""
+        self.commands += 1
+        command = args[0].decode().upper()
+        if command == "AUTH":
+            if self.password is not None and args[-1].decode() != self.password:
+                return ValueError("invalid password")
+            session["authenticated"] = True
+            return "OK"
+        if not session["authenticated"]:
+            return PermissionError("NOAUTH Authentication required.")
+        if command in ("PING", "SELECT"):
+            return "OK"
+        if command == "GET":
+            return self._get(args[1])
+        if command == "DEL":
+            return sum(1 for key in args[1:] if self._get(key) is not None and self._data.pop(key))
+        if command == "SET":
+            key, value = args[1], args[2]
+            options = [arg.decode().upper() for arg in args[3:]]
+            expires_at = None
+            if "PX" in options:
+                expires_at = time.time() + int(options[options.index("PX") + 1]) / 1000
+            elif "EX" in options:
+                expires_at = time.time() + int(options[options.index("EX") + 1])
+            exists = self._get(key) is not None
+            if ("NX" in options and exists) or ("XX" in options and not exists):
+                return None
+            self._data[key] = (value, expires_at)
+            return "OK"
+        if command == "EVAL" and args[1].decode() == RELEASE_SCRIPT:
+            key, token = args[3], args[4]
+            if self._get(key) == token:
+                del self._data[key]
+                return 1
+            return 0
+        if command == "EVAL" and args[1].decode() == RENEW_SCRIPT:
+            key, token, ttl_ms = args[3], args[4], int(args[5])
+            if self._get(key) == token:
+                self._data[key] = (token, time.time() + ttl_ms / 1000)
+                return 1
+            return 0
+        return ValueError(f"unsupported command '{command}'")
+
+    async def handle_connection(self, reader, writer):
+        session = {"authenticated": self.password is None}
+        try:
+            while True:
+                args = await read_reply(reader)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(encode_reply(self.execute(args, session)))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host, port):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+async def serve(args):
+    fake = FakeRedis(latency=args.latency, password=args.password)
+    server = await fake.start(args.host, args.port)
+    print(f"Fake Redis listening on redis://{args.host}:{args.port}/0", flush=True)
+    async with server:
+        await server.serve_forever()
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=6390)
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа, секунды")
+    arg_parser.add_argument("--password", help="Требовать AUTH с этим паролем")
+    asyncio.run(serve(arg_parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Локальная замена хостов Wildberries для бенчмарков: корзины wbbasket.ru, цены card.wb.ru и поиск search.wb.ru.
+
+Ответы строятся из фикстур benchmarks/fixtures, задержка, ошибки 5xx и 429
+задаются параметрами. Адреса для парсера (см. parser/config.py):
+
+    BASKET_BASE_URL=http://127.0.0.1:PORT/{basket}
+    PRICE_BASE_URL=http://127.0.0.1:PORT/prices?appType=1
+    SEARCH_BASE_URL=http://127.0.0.1:PORT/search?appType=1
+
+Запуск: PYTHONPATH=src python benchmarks/fake_wb.py --port 8500 --latency 0.02 --throttle-rate 0.01
+GET /_stats возвращает счетчики запросов, POST /_reset их обнуляет.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import zlib
+from aiohttp import web
+from parser.basket import STATIC_RANGES, basket_host
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+def expected_basket(vol):
+    """Корзина, в которой фейк "хранит" товар: по статической таблице парсера."""
+    for low, high, basket_num in STATIC_RANGES:
+        if low <= vol <= high:
+            return basket_host(basket_num)
+    return None
+
+def synthetic_ids(query, page, count):
+    """ID товаров страницы выдачи; не пересекаются с артикулами, которые использует бенчмарк."""
+    base = 10**12 + (zlib.crc32(query.encode()) % 10**6) * 10**5 + page * 1000
+    return range(base, base + count)
+
+class FakeWildberries:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=None, total=10000, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.total = total
+        self.random = random.Random(seed)
+        self.card = load_fixture("card.json")
+        self.price_product = load_fixture("prices.json")["data"]["products"][0]
+        search_page = load_fixture("search_page.json")
+        self.search_product = search_page["data"]["products"][0]
+        self.page_size = len(search_page["data"]["products"])
+        self._pages = {}
+        self.reset()
+
+    def reset(self):
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "not_found": 0}
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_get("/_stats", self.handle_stats)
+        app.router.add_post("/_reset", self.handle_reset)
+        app.router.add_get("/prices", self.handle_prices)
+        app.router.add_get("/search", self.handle_search)
+        app.router.add_get("/{basket}/vol{vol}/part{part}/{nm_id}/info/ru/card.json", self.handle_card)
+        return app
+
+    async def _simulate(self):
+        """Задержка и случайные сбои; возвращает ответ-сбой или None."""
+        self.stats["requests"] += 1
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            self.stats["throttled"] += 1
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+            return web.Response(status=429, headers=headers)
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=503)
+        return None
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats)
+
+    async def handle_reset(self, request):
+        self.reset()
+        return web.json_response(self.stats)
+
+    async def handle_card(self, request):
+        failure = await self._simulate()
+        if failure is not None:
+            return failure
+        nm_id = int(request.match_info["nm_id"])
+        if request.match_info["basket"] != expected_basket(int(request.match_info["vol"])):
+            self.stats["not_found"] += 1
+            return web.Response(status=404)
+        card = dict(self.card, nm_id=nm_id)
+        return web.json_response(card)
+
+    async def handle_prices(self, request):
+        failure = await self._simulate()
+        if failure is not None:
+            return failure
+        nm_ids = [int(nm_id) for nm_id in request.query.get("nm", "").split(";") if nm_id]
+        products = []
+        for nm_id in nm_ids:
+            product = copy.deepcopy(self.price_product)
+            product["id"] = nm_id
+            products.append(product)
+        return web.json_response({"state": 0, "data": {"products": products}})
+
+    async def handle_search(self, request):
+        failure = await self._simulate()
+        if failure is not None:
+            return failure
+        query = request.query.get("query", "")
+        page = int(request.query.get("page", "1"))
+        return web.Response(body=self._search_page(query, page), content_type="application/json")
+
+    def _search_page(self, query, page):
+        key = (query, page)
+        body = self._pages.get(key)
+        if body is None:
+            pages_total = -(-self.total // self.page_size)
+            count = self.page_size if page < pages_total else (self.total - (pages_total - 1) * self.page_size if page == pages_total else 0)
+            products = [dict(self.search_product, id=product_id) for product_id in synthetic_ids(query, page, count)]
+            body = json.dumps({"data": {"total": self.total, "products": products}}, ensure_ascii=False).encode()
+            if len(self._pages) > 5000:
+                self._pages.clear()
+            self._pages[key] = body
+        return body
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8500)
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа, секунды")
+    arg_parser.add_argument("--jitter", type=float, default=0.0, help="Случайная добавка к задержке, секунды")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 503")
+    arg_parser.add_argument("--throttle-rate", type=float, default=0.0, help="Доля ответов 429")
+    arg_parser.add_argument("--retry-after", type=float, help="Значение Retry-After в ответах 429")
+    arg_parser.add_argument("--total", type=int, default=10000, help="Товаров в выдаче по любому запросу")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    fake = FakeWildberries(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after, total=args.total, seed=args.seed
+    )
+    print(f"Fake Wildberries listening on http://{args.host}:{args.port}", flush=True)
+    web.run_app(fake.create_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    main()
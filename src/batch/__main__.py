@@ -0,0 +1,26 @@
+import argparse
+import asyncio
+from parser.config import SEARCH_JOB_PAGE_BUDGET
+from .runner import run
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        prog="python -m batch",
+        description="Пакетный поиск позиций товаров Wildberries по ключевым словам без Telegram-бота."
+    )
+    arg_parser.add_argument("input", help="CSV (колонки nm_id, keywords через |) или JSONL с заданиями")
+    arg_parser.add_argument("output", help="JSONL-файл результатов (дописывается при повторном запуске)")
+    arg_parser.add_argument("-w", "--workers", type=int, default=4, help="Число параллельно обрабатываемых строк")
+    arg_parser.add_argument("--checkpoint", help="Файл контрольных точек (по умолчанию <output>.checkpoint)")
+    arg_parser.add_argument(
+        "--page-budget", type=int, default=SEARCH_JOB_PAGE_BUDGET,
+        help="Страниц выдачи на строку по всем ее словам (0 - без ограничения)"
+    )
+    args = arg_parser.parse_args()
+    stats = asyncio.run(run(
+        args.input, args.output, workers=args.workers, checkpoint_path=args.checkpoint, page_budget=args.page_budget
+    ))
+    print(f"Done: {stats['done']}, failed: {stats['failed']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import csv
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+def _parse_keywords(value):
+    if not value:
+        return None
+    if isinstance(value, str):
+        keywords = [kw.strip() for kw in value.split("|")]
+    else:
+        keywords = [str(kw).strip() for kw in value]
+    return [kw for kw in keywords if kw] or None
+
+def read_tasks(path):
+    """Читает задания из CSV или JSONL.
+
+    CSV: колонки nm_id и необязательная keywords (несколько слов через "|").
+    JSONL: объекты {"nm_id": ..., "keywords": [...]} или {"nm_id": ..., "keyword": "..."}.
+    Без ключевых слов они извлекаются из карточки товара.
+    Возвращает список словарей {"row", "nm_id", "keywords"}.
+    """
+    tasks = []
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl") or path.endswith(".json"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row_idx, row in enumerate(rows):
+            try:
+                nm_id = int(row["nm_id"])
+            except (KeyError, TypeError, ValueError):
+                logger.error("Skipping input row %s: no valid nm_id in %s", row_idx, row)
+                continue
+            keywords = _parse_keywords(row.get("keywords") or row.get("keyword"))
+            tasks.append({"row": row_idx, "nm_id": nm_id, "keywords": keywords})
+    return tasks
+
+class ResultWriter:
+    """Пишет результаты в JSONL по мере готовности и ведет файл контрольных точек.
+
+    В файле контрольных точек перечислены полностью обработанные строки входа;
+    для частично обработанных строк повторно не выполняются пары
+    (nm_id, keyword), уже записанные в выходной файл.
+    """
+
+    def __init__(self, output_path, checkpoint_path=None):
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+        self.done_rows = set()
+        self.done_pairs = set()
+        self._load()
+        self._output = open(output_path, "a", encoding="utf-8")
+        self._checkpoint = open(self.checkpoint_path, "a", encoding="utf-8")
+
+    def _load(self):
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                self.done_rows = {int(line) for line in f if line.strip()}
+        if os.path.exists(self.output_path):
+            with open(self.output_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Недописанная строка после аварийной остановки
+                    if record.get("status") != "error":
+                        self.done_pairs.add((record.get("nm_id"), record.get("keyword")))
+        if self.done_rows or self.done_pairs:
+            logger.info("Resuming: %s rows and %s results already done", len(self.done_rows), len(self.done_pairs))
+
+    def is_done(self, nm_id, keyword):
+        return (nm_id, keyword) in self.done_pairs
+
+    def write(self, record):
+        """Записывает один результат и сразу сбрасывает его на диск."""
+        self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._output.flush()
+        self.done_pairs.add((record.get("nm_id"), record.get("keyword")))
+
+    def mark_row_done(self, row):
+        self._checkpoint.write(f"{row}\n")
+        self._checkpoint.flush()
+        os.fsync(self._checkpoint.fileno())
+        self.done_rows.add(row)
+
+    def close(self):
+        self._output.close()
+        self._checkpoint.close()
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from parser.parser import get_product_info
+from parser.config import SEARCH_JOB_PAGE_BUDGET
+from parser.search import search_keywords
+from parser.http import close_session
+from parser.cache import open_store
+from parser.executor import start_pool, shutdown_pool
+from .files import read_tasks, ResultWriter
+
+logger = logging.getLogger(__name__)
+
+def make_record(nm_id, keyword, search_result):
+    """Формирует запись результата для JSONL."""
+    record = {"nm_id": nm_id, "keyword": keyword, "ts": int(time.time())}
+    if search_result is None:
+        record["status"] = "error"
+        return record
+    position, page, total_products, truncated_at = search_result
+    if position is not None:
+        status = "found"
+    elif truncated_at is not None:
+        status = "truncated"  # Обход остановлен лимитом страниц: "не найден" не доказано
+    else:
+        status = "not_found"
+    record.update({
+        "status": status,
+        "position": position,
+        "page": page,
+        "total": total_products
+    })
+    if truncated_at is not None:
+        record["pages_scanned"] = truncated_at
+    return record
+
+async def process_task(task, writer, page_budget=SEARCH_JOB_PAGE_BUDGET):
+    """Обрабатывает одну строку входа: ключевые слова и поиск позиций по ним.
+
+    Возвращает False, если строку нужно повторить из-за ошибок. Обход,
+    остановленный лимитом страниц, - окончательный результат (status
+    "truncated" с глубиной pages_scanned): повтор с тем же лимитом дал бы
+    то же самое.
+    """
+    nm_id = task["nm_id"]
+    keywords = task["keywords"]
+    if keywords is None:
+        product_info = await get_product_info(f"https://www.wildberries.ru/catalog/{nm_id}/detail.aspx")
+        if 'error' in product_info:
+            writer.write({"nm_id": nm_id, "keyword": None, "status": "error", "error": product_info['error'], "ts": int(time.time())})
+            return False
+        keywords = product_info['keywords']
+
+    keywords = [keyword for keyword in keywords if not writer.is_done(nm_id, keyword)]
+    if keywords:
+        results = await search_keywords(
+            nm_id, keywords, page_budget=page_budget,
+            on_result=lambda idx, keyword, result: writer.write(make_record(nm_id, keyword, result))
+        )
+        if any(result is None for result in results):
+            return False
+    return True
+
+async def run(input_path, output_path, workers=4, checkpoint_path=None, page_budget=SEARCH_JOB_PAGE_BUDGET):
+    """Выполняет задания из input_path в workers параллельных обработчиков, дописывая результаты в output_path.
+
+    page_budget - лимит страниц выдачи на строку (0 - без ограничения, см. plan_search).
+    """
+    tasks = read_tasks(input_path)
+    writer = ResultWriter(output_path, checkpoint_path)
+    queue = asyncio.Queue()
+    for task in tasks:
+        if task["row"] not in writer.done_rows:
+            queue.put_nowait(task)
+    total = queue.qsize()
+    logger.info("Batch run: %s input rows, %s to process, %s workers", len(tasks), total, workers)
+    stats = {"done": 0, "failed": 0}
+    start_time = time.time()
+
+    async def worker():
+        while True:
+            try:
+                task = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                ok = await process_task(task, writer, page_budget)
+            except Exception as e:
+                logger.error("Batch task for nm_id=%s failed: %s", task['nm_id'], e)
+                ok = False
+            # Строки с ошибками не отмечаются, чтобы повторить их при следующем запуске
+            if ok:
+                writer.mark_row_done(task["row"])
+                stats["done"] += 1
+            else:
+                stats["failed"] += 1
+            processed = stats["done"] + stats["failed"]
+            if processed % 10 == 0 or processed == total:
+                elapsed_time = time.time() - start_time
+                logger.info("Batch progress: %s/%s rows in %.1fs, failed=%s", processed, total, elapsed_time, stats['failed'])
+
+    await open_store()
+    await start_pool()
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    finally:
+        writer.close()
+        shutdown_pool()
+        await close_session()
+    return stats
@@ -1,9 +1,23 @@
 import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher
+from parser.http import close_session
+from parser.cache import open_store
+from parser.state import close_state_backend
+from parser.ai_model import get_model_service
+from parser.executor import start_pool, shutdown_pool
+from parser.metrics import register_stats, start_metrics_server
 from .handlers import dp
-from .config import logger
+from .jobs import job_manager
+from .updates import update_dispatcher
+from .subscriptions import subscription_scheduler
+from .messages import format_subscription_report
+from .config import BOT_MODE, METRICS_HOST, METRICS_PORT
+from .webhook import run_webhook
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 TOKEN = os.getenv('TELEGRAM_TOKEN')
@@ -12,9 +26,45 @@ if not TOKEN:
 
 bot = Bot(token=TOKEN)
 
+async def send_subscription_report(sub, report):
+    await bot.send_message(sub.chat_id, format_subscription_report(sub.nm_id, report), parse_mode='Markdown')
+
 async def main():
-    logger.info("Starting bot polling")
-    await dp.start_polling(bot)
+    await open_store()
+    if os.getenv("USE_AI", "false").lower() == "true":
+        # Модель KeyBERT загружается в фоновом потоке и остается в памяти
+        get_model_service().start()
+        register_stats("keybert", get_model_service().stats)
+    else:
+        # Процессы пула загружают словари pymorphy2 до приема сообщений
+        await start_pool()
+    update_dispatcher.start()
+    job_manager.start()
+    register_stats("search_jobs", job_manager.stats)
+    register_stats("message_updates", update_dispatcher.stats)
+    subscription_scheduler.notify = send_subscription_report
+    subscription_scheduler.start()
+    register_stats("subscriptions", subscription_scheduler.stats)
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        logger.info("Metrics available at http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+    try:
+        if BOT_MODE == "webhook":
+            logger.info("Starting bot in webhook mode")
+            await run_webhook(bot, dp)
+        else:
+            logger.info("Starting bot polling")
+            await dp.start_polling(bot)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await subscription_scheduler.stop()
+        await job_manager.stop()
+        await update_dispatcher.stop()
+        shutdown_pool()
+        await close_session()
+        await close_state_backend()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
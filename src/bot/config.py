@@ -1,34 +1,45 @@
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import parser.config  # noqa: F401 - настраивает логирование (см. parser/logs.py)
 
 logger = logging.getLogger(__name__)
 logger.info("Starting bot/config.py module initialization")
 
-log_dir = "/app/logs"
-try:
-    os.makedirs(log_dir, exist_ok=True)
-    logger.info(f"Created log directory: {log_dir}")
-except Exception as e:
-    logger.error(f"Failed to create log directory {log_dir}: {str(e)}")
-
-log_file = os.path.join(log_dir, "parser.log")
-file_handler = RotatingFileHandler(
-    log_file,
-    maxBytes=10*1024*1024,  # 10 МБ
-    backupCount=5  # Хранить до 5 резервных копий
-)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        file_handler
-    ]
-)
-
-# Переменная для отслеживания активных поисков
-active_searches = {}
+# Очередь поисков (см. bot/jobs.py)
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))  # Одновременно выполняемых поисков
+SEARCH_PER_CHAT_LIMIT = int(os.getenv("SEARCH_PER_CHAT_LIMIT", "1"))  # Одновременных поисков одного чата
+SEARCH_MAX_QUEUED_PER_CHAT = int(os.getenv("SEARCH_MAX_QUEUED_PER_CHAT", "3"))  # Поисков чата в очереди
+JOB_STATE_TTL = int(os.getenv("JOB_STATE_TTL", str(6 * 3600)))  # Сколько хранить запись о задании в общем хранилище
+CANCEL_POLL_INTERVAL = float(os.getenv("CANCEL_POLL_INTERVAL", "1"))  # Как часто проверять отмены, нажатые на других репликах
+
+# Правки сообщений Telegram (см. bot/updates.py)
+EDIT_GLOBAL_RATE = float(os.getenv("EDIT_GLOBAL_RATE", "25"))  # Правок в секунду на всего бота
+EDIT_CHAT_INTERVAL = float(os.getenv("EDIT_CHAT_INTERVAL", "2"))  # Минимум секунд между правками в одном чате
+EDIT_SENDERS = int(os.getenv("EDIT_SENDERS", "4"))  # Одновременных запросов к Telegram
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Публичный адрес; если пуст, вебхук в Telegram не регистрируется
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # Проверяется заголовок X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "32"))  # Одновременно обрабатываемых обновлений
+
+# Кэш file_id фотографий товаров (см. bot/photos.py)
+PHOTO_CACHE_TTL = int(os.getenv("PHOTO_CACHE_TTL", str(30 * 86400)))  # file_id в Telegram не устаревают, храним 30 дней
+PHOTO_CACHE_MAX_BYTES = int(os.getenv("PHOTO_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Метрики в формате Prometheus (см. parser/metrics.py); METRICS_PORT=0 отключает отдельный сервер
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Подписки на регулярную проверку позиций и цен (см. bot/subscriptions.py)
+SUBSCRIPTION_INTERVAL_HOURS = float(os.getenv("SUBSCRIPTION_INTERVAL_HOURS", "6"))  # Интервал по умолчанию
+SUBSCRIPTION_MIN_INTERVAL_HOURS = float(os.getenv("SUBSCRIPTION_MIN_INTERVAL_HOURS", "1"))
+SUBSCRIPTIONS_PER_CHAT = int(os.getenv("SUBSCRIPTIONS_PER_CHAT", "10"))
+SCHEDULER_TICK = float(os.getenv("SCHEDULER_TICK", "30"))  # Как часто проверять наступившие подписки, секунды
+SCHEDULER_MERGE_WINDOW = float(os.getenv("SCHEDULER_MERGE_WINDOW", "600"))  # Насколько заранее брать подписки с общими запросами
+SCHEDULER_LOCK_TTL = float(os.getenv("SCHEDULER_LOCK_TTL", "900"))  # Аренда проверки подписок одной репликой; продлевается каждую треть срока
 
 logger.info("bot/config.py module initialization completed")
\ No newline at end of file
@@ -1,11 +1,21 @@
+import asyncio
+import logging
 from aiogram import types
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from parser.parser import get_product_info
-from parser.search import search_product_by_keywords
-from .messages import format_product_info, format_final_results, format_cancelled_results
-from .config import logger, active_searches
-import asyncio
+from parser.search import search_keywords
+from parser.history import get_history_store
+from parser.utils import extract_product_id
+from .config import SUBSCRIPTION_INTERVAL_HOURS, SUBSCRIPTION_MIN_INTERVAL_HOURS, SUBSCRIPTIONS_PER_CHAT
+from .messages import format_product_info, format_queue_position, format_intermediate_results, format_keyword_result, format_final_results, format_cancelled_results
+from .messages import format_subscriptions, format_history
+from .jobs import job_manager
+from .updates import update_dispatcher
+from .photos import send_product_photo
+from .subscriptions import subscription_scheduler
+
+logger = logging.getLogger(__name__)
 
 # Регистрация обработчиков
 from aiogram import Dispatcher
@@ -13,11 +23,82 @@ dp = Dispatcher()
 
 @dp.message(Command("start"))
 async def send_welcome(message: types.Message):
-    await message.reply('Привет! Я бот для парсинга Wildberries. Отправь мне ссылку на товар.')
+    await message.reply(
+        'Привет! Я бот для парсинга Wildberries. Отправь мне ссылку на товар.\n\n'
+        '/track <артикул> [часы] - регулярно проверять позиции и цену товара\n'
+        '/untrack <артикул> - перестать отслеживать товар\n'
+        '/subscriptions - список отслеживаемых товаров\n'
+        '/history <артикул> - история позиций и цены'
+    )
+
+def parse_nm_id(value):
+    """Артикул из аргумента команды: число или ссылка на товар."""
+    if value.isdigit():
+        return int(value)
+    return extract_product_id(value)
+
+@dp.message(Command("track"))
+async def track_product(message: types.Message, command: CommandObject):
+    args = (command.args or "").split()
+    nm_id = parse_nm_id(args[0]) if args else None
+    if nm_id is None:
+        await message.reply("ℹ️ Использование: /track <артикул или ссылка> [интервал в часах]")
+        return
+    try:
+        hours = float(args[1]) if len(args) > 1 else SUBSCRIPTION_INTERVAL_HOURS
+    except ValueError:
+        await message.reply("❌ Интервал должен быть числом часов.")
+        return
+    hours = max(hours, SUBSCRIPTION_MIN_INTERVAL_HOURS)
+
+    product_info = await get_product_info(f"https://www.wildberries.ru/catalog/{nm_id}/detail.aspx")
+    if 'error' in product_info:
+        await message.reply(f"❌ Ошибка: {product_info['error']}")
+        return
+    if not product_info['keywords']:
+        await message.reply("❌ Нет ключевых слов для отслеживания.")
+        return
+
+    sub = await subscription_scheduler.subscribe(message.chat.id, nm_id, product_info['keywords'], hours * 3600)
+    if sub is None:
+        await message.reply(f"❌ Можно отслеживать не больше {SUBSCRIPTIONS_PER_CHAT} товаров. Удалите лишние командой /untrack.")
+        return
+    logger.info("Chat %s subscribed to nm_id=%s every %sh", message.chat.id, nm_id, hours)
+    await message.reply(
+        f"✅ Товар {nm_id} отслеживается по {len(sub.keywords)} ключевым словам каждые {hours:g} ч.\n"
+        f"Историю можно посмотреть командой /history {nm_id}."
+    )
+
+@dp.message(Command("untrack"))
+async def untrack_product(message: types.Message, command: CommandObject):
+    nm_id = parse_nm_id(command.args.strip()) if command.args else None
+    if nm_id is None:
+        await message.reply("ℹ️ Использование: /untrack <артикул или ссылка>")
+        return
+    if await subscription_scheduler.unsubscribe(message.chat.id, nm_id):
+        await message.reply(f"✅ Товар {nm_id} больше не отслеживается.")
+    else:
+        await message.reply(f"ℹ️ Товар {nm_id} не отслеживался.")
+
+@dp.message(Command("subscriptions"))
+async def list_subscriptions(message: types.Message):
+    subscriptions = await subscription_scheduler.store.for_chat(message.chat.id)
+    await message.reply(format_subscriptions(subscriptions), parse_mode='Markdown')
+
+@dp.message(Command("history"))
+async def show_history(message: types.Message, command: CommandObject):
+    nm_id = parse_nm_id(command.args.strip()) if command.args else None
+    if nm_id is None:
+        await message.reply("ℹ️ Использование: /history <артикул или ссылка>")
+        return
+    # Ответ строится по сохраненным проверкам, без обхода выдачи
+    history = get_history_store()
+    positions, prices = await asyncio.gather(history.latest_positions(nm_id), history.latest_prices(nm_id))
+    await message.reply(format_history(nm_id, positions, prices), parse_mode='Markdown')
 
 @dp.message()
 async def handle_link(message: types.Message):
-    product_info = get_product_info(message.text)
+    product_info = await get_product_info(message.text)
     if 'error' in product_info:
         await message.reply(f"❌ Ошибка: {product_info['error']}")
         return
@@ -28,9 +109,10 @@ async def handle_link(message: types.Message):
 
     try:
         if product_info['photos']:
-            await message.bot.send_photo(
-                chat_id=message.chat.id,
-                photo=product_info['photos'][0],
+            await send_product_photo(
+                message.bot,
+                message.chat.id,
+                product_info['photos'][0],
                 caption=response,
                 parse_mode='Markdown',
                 reply_markup=keyboard
@@ -44,98 +126,99 @@ async def handle_link(message: types.Message):
 async def process_search_callback(callback_query: types.CallbackQuery):
     await callback_query.answer()
     nm_id = int(callback_query.data.split('_')[1])
-    logger.info(f"Starting search for nm_id={nm_id}")
+    chat_id = callback_query.message.chat.id
+    logger.info("Starting search for nm_id=%s", nm_id)
 
     try:
         await callback_query.message.edit_reply_markup(reply_markup=None)
     except Exception as e:
-        logger.error(f"Failed to remove search button: {str(e)}")
+        logger.error("Failed to remove search button: %s", e)
 
-    cancel_button = InlineKeyboardButton(text="❌ Отменить поиск", callback_data=f"cancel_{nm_id}")
+    job = job_manager.create_job(chat_id, nm_id)
+    cancel_button = InlineKeyboardButton(text="❌ Отменить поиск", callback_data=f"cancel_{job.job_id}")
     keyboard = InlineKeyboardMarkup(inline_keyboard=[[cancel_button]])
     search_message = await callback_query.message.reply(
-        "🔍 Поиск начат. Это займет некоторое время, ожидайте...",
+        "🔍 Поиск поставлен в очередь, ожидайте...",
         reply_markup=keyboard
     )
 
-    cancel_event = asyncio.Event()
-    chat_id = callback_query.message.chat.id
-    active_searches[chat_id] = {'nm_id': nm_id, 'cancel_event': cancel_event}
+    def on_queue_position(job, position):
+        update_dispatcher.submit(search_message, format_queue_position(position), keyboard)
 
-    product_info = get_product_info(f"https://www.wildberries.ru/catalog/{nm_id}/detail.aspx")
-    if 'error' in product_info:
-        await search_message.edit_text(f"❌ Ошибка при получении данных: {product_info['error']}", reply_markup=None)
-        if chat_id in active_searches:
-            del active_searches[chat_id]
-        return
+    def on_cancelled(job):
+        update_dispatcher.submit(search_message, format_cancelled_results(job.results))
 
-    keywords = product_info['keywords']
-    if not keywords:
-        await search_message.edit_text("❌ Нет ключевых слов для поиска.", reply_markup=None)
-        if chat_id in active_searches:
-            del active_searches[chat_id]
-        return
+    job.run = lambda job: run_search(job, search_message, keyboard)
+    job.on_queue_position = on_queue_position
+    job.on_cancelled = on_cancelled
+    if not job_manager.submit(job):
+        update_dispatcher.submit(
+            search_message, "❌ Слишком много поисков в очереди. Дождитесь завершения текущих или отмените их."
+        )
 
-    results = []
-    for idx, keyword in enumerate(keywords, 1):
-        if cancel_event.is_set():
-            break
+async def run_search(job, search_message, keyboard):
+    """Выполняет поиск позиций товара по ключевым словам для задания из очереди."""
+    nm_id = job.nm_id
+    cancel_event = job.cancel_event
+
+    # После отмены сообщение принадлежит итогу отмены: правки с прогрессом его бы перезаписали
+    def submit(text, reply_markup=None):
+        if not cancel_event.is_set():
+            update_dispatcher.submit(search_message, text, reply_markup)
+
+    submit("🔍 Поиск начат. Это займет некоторое время, ожидайте...", keyboard)
 
-        search_result = await search_product_by_keywords(
-            nm_id, keyword, update_message=search_message, keyword_idx=idx,
-            total_keywords=len(keywords), previous_results=results, cancel_event=cancel_event
+    # Результаты по мере завершения ключевых слов (в любом порядке); job.results обновляется
+    # на месте, чтобы промежуточные сообщения и итог отмены показывали все готовые слова
+    completed = {}
+    results = job.results
+    final_text = None
+    try:
+        product_info = await get_product_info(f"https://www.wildberries.ru/catalog/{nm_id}/detail.aspx")
+        if 'error' in product_info:
+            final_text = f"❌ Ошибка при получении данных: {product_info['error']}"
+            return
+
+        keywords = product_info['keywords']
+        if not keywords:
+            final_text = "❌ Нет ключевых слов для поиска."
+            return
+
+        def on_result(idx, keyword, search_result):
+            completed[idx] = format_keyword_result(idx, keyword, search_result)
+            results[:] = [completed[i] for i in sorted(completed)]
+
+        # Прогресс отправляется в фоне: диспетчер оставляет только последнее состояние сообщения
+        def on_progress(progress):
+            message_text = format_intermediate_results(
+                progress.keyword, progress.keyword_idx, progress.total_keywords,
+                progress.total_products, progress.page, results
+            )
+            submit(message_text, keyboard)
+
+        await search_keywords(
+            nm_id, keywords, on_result=on_result, on_progress=on_progress, cancel_event=cancel_event, progress_interval=1
         )
-        if search_result is None:
-            results.append(f"  {idx}. Ключевое слово \"{keyword}\": ошибка при поиске")
-        else:
-            position, page, total_products = search_result
-            if position is not None and page is not None:
-                results.append(
-                    f"  {idx}. Ключевое слово \"{keyword}\":\n"
-                    f"    • Всего товаров: {total_products}\n"
-                    f"    • Позиция в выдаче: {position}\n"
-                    f"    • Страница выдачи: {page}"
-                )
-            else:
-                results.append(
-                    f"  {idx}. Ключевое слово \"{keyword}\":\n"
-                    f"    • Всего товаров: {total_products}\n"
-                    f"    • Товар не найден"
-                )
-
-    if not cancel_event.is_set():
         final_text = format_final_results(results)
-        await search_message.edit_text(final_text, reply_markup=None)
-
-    if chat_id in active_searches:
-        del active_searches[chat_id]
+    finally:
+        # Последняя правка отправляется всегда и убирает кнопку отмены. Итог отмены пишет
+        # реплика, выполняющая поиск: только у нее есть готовые результаты
+        if cancel_event.is_set():
+            final_text = format_cancelled_results(results)
+        elif final_text is None:
+            final_text = "❌ Поиск прерван из-за ошибки. Попробуйте еще раз."
+        update_dispatcher.submit(search_message, final_text)
 
 @dp.callback_query(lambda c: c.data.startswith('cancel_'))
 async def process_cancel_callback(callback_query: types.CallbackQuery):
-    chat_id = callback_query.message.chat.id
-    if chat_id not in active_searches:
-        await callback_query.message.edit_text("❌ Поиск уже завершен или не начинался.", reply_markup=None)
+    job_id = callback_query.data.split('_', 1)[1]
+    # Задание может выполняться на другой реплике - тогда отмена передается через общее хранилище
+    if not await job_manager.request_cancel(job_id, callback_query.message.chat.id):
+        update_dispatcher.submit(callback_query.message, "❌ Поиск уже завершен или не начинался.")
         await callback_query.answer()
         return
 
-    active_searches[chat_id]['cancel_event'].set()
-
-    current_message = callback_query.message.text
-    results = []
-    if "Промежуточные результаты" in current_message:
-        lines = current_message.split('\n')
-        for line in lines:
-            if line.startswith("🔎 Ключевое слово"):
-                break
-            if line.strip().startswith("1. ") or line.strip().startswith("  1. "):
-                results = lines[lines.index(line):]
-                break
-
-    final_text = format_cancelled_results(results)
-    await callback_query.message.edit_text(final_text, reply_markup=None)
+    # Сообщение с результатами на момент отмены обновляет сам поиск (run_search или on_cancelled)
     await callback_query.message.reply("ℹ️ Поиск отменен. Вы можете прислать новую ссылку на товар.")
 
-    if chat_id in active_searches:
-        del active_searches[chat_id]
-
-    await callback_query.answer()
\ No newline at end of file
+    await callback_query.answer()
@@ -0,0 +1,228 @@
+import asyncio
+import inspect
+import itertools
+import json
+import logging
+from collections import OrderedDict, deque
+from parser.config import REPLICA_ID
+from parser.state import get_state_backend, STATE_ERRORS
+from .config import SEARCH_WORKERS, SEARCH_PER_CHAT_LIMIT, SEARCH_MAX_QUEUED_PER_CHAT, JOB_STATE_TTL, CANCEL_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+class SearchJob:
+    """Задание на поиск позиций товара для одного чата."""
+
+    def __init__(self, job_id, chat_id, nm_id):
+        self.job_id = job_id
+        self.chat_id = chat_id
+        self.nm_id = nm_id
+        self.cancel_event = asyncio.Event()
+        self.status = "new"  # new -> queued -> running -> done / cancelled / failed
+        self.run = None  # Корутина-функция run(job), выполняющая поиск
+        self.on_queue_position = None  # Колбэк on_queue_position(job, position)
+        self.on_cancelled = None  # Колбэк on_cancelled(job) для задания, отмененного в очереди
+        self.results = []  # Готовые результаты по ключевым словам в порядке слов
+        self._last_position = None
+
+class JobManager:
+    """Очередь поисков с пулом обработчиков и справедливым планированием по чатам.
+
+    Задания каждого чата стоят в своей очереди, обработчики берут их по кругу
+    (round-robin), поэтому чат с десятком поисков не задерживает остальных.
+    Каждому ожидающему заданию сообщается его позиция в общей очереди.
+
+    Очередь у каждой реплики своя. При общем хранилище состояния задания
+    публикуются в нем, поэтому отмена, нажатая на другой реплике, доходит до
+    реплики, выполняющей задание (она проверяет сигналы отмены раз в
+    CANCEL_POLL_INTERVAL секунд).
+    """
+
+    def __init__(self, workers=SEARCH_WORKERS, per_chat_limit=SEARCH_PER_CHAT_LIMIT, max_queued_per_chat=SEARCH_MAX_QUEUED_PER_CHAT):
+        self.workers = workers
+        self.per_chat_limit = per_chat_limit
+        self.max_queued_per_chat = max_queued_per_chat
+        self.jobs = {}  # job_id -> SearchJob (ожидающие и выполняющиеся)
+        self._queues = OrderedDict()  # chat_id -> deque заданий; порядок - очередь обхода
+        self._running = {}  # chat_id -> число выполняющихся заданий
+        self._ids = itertools.count(1)
+        self._wakeup = None
+        self._tasks = []
+        self._backend = None
+
+    def start(self):
+        """Запускает обработчики (вызывается из работающего цикла событий)."""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker(i)) for i in range(self.workers)]
+        backend = get_state_backend()
+        if backend.shared:
+            self._backend = backend
+            self._tasks.append(asyncio.ensure_future(self._watch_cancellations()))
+        logger.info("Search job manager started with %s workers, per-chat limit %s", self.workers, self.per_chat_limit)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def create_job(self, chat_id, nm_id):
+        """Создает задание с новым ID; в очередь оно попадает через submit."""
+        return SearchJob(f"{REPLICA_ID}-{next(self._ids):x}", chat_id, nm_id)
+
+    def submit(self, job):
+        """Ставит задание в очередь чата. Возвращает False, если очередь чата переполнена."""
+        queue = self._queues.setdefault(job.chat_id, deque())
+        if len(queue) >= self.max_queued_per_chat:
+            if not queue:
+                del self._queues[job.chat_id]
+            return False
+        job.status = "queued"
+        queue.append(job)
+        self.jobs[job.job_id] = job
+        self._publish(job)
+        logger.info("Queued search job %s for chat_id=%s, nm_id=%s", job.job_id, job.chat_id, job.nm_id)
+        self._wakeup.set()
+        self._notify_positions()
+        return True
+
+    def cancel(self, job_id):
+        """Отменяет задание по ID: убирает из очереди или сигналит выполняющемуся. Возвращает задание или None."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        if job.status == "queued":
+            queue = self._queues.get(job.chat_id)
+            if queue is not None and job in queue:
+                queue.remove(job)
+                if not queue:
+                    del self._queues[job.chat_id]
+            job.status = "cancelled"
+            del self.jobs[job_id]
+            self._unpublish(job)
+            self._notify_positions()
+            if job.on_cancelled is not None:
+                job.on_cancelled(job)
+        logger.info("Cancelled search job %s", job_id)
+        return job
+
+    async def request_cancel(self, job_id, chat_id):
+        """Отменяет задание чата, где бы оно ни выполнялось. Возвращает False, если такого задания нет."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            if job.chat_id != chat_id:
+                return False
+            self.cancel(job_id)
+            return True
+        if self._backend is None:
+            return False
+        try:
+            record = await self._backend.get(f"job:{job_id}")
+            if record is None or json.loads(record)["chat_id"] != chat_id:
+                return False
+            await self._backend.set(f"cancel:{job_id}", "1", JOB_STATE_TTL)
+        except STATE_ERRORS as e:
+            logger.error("Failed to request cancellation of search job %s: %s", job_id, e)
+            return False
+        logger.info("Requested cancellation of search job %s on another replica", job_id)
+        return True
+
+    def queue_order(self):
+        """Порядок, в котором будут запущены ожидающие задания (по кругу по чатам)."""
+        queues = [list(queue) for queue in self._queues.values()]
+        order = []
+        for round_idx in range(max((len(queue) for queue in queues), default=0)):
+            order.extend(queue[round_idx] for queue in queues if round_idx < len(queue))
+        return order
+
+    def stats(self):
+        return {
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "running": sum(self._running.values()),
+            "workers": self.workers
+        }
+
+    def _publish(self, job):
+        """Записывает задание в общее хранилище (в фоне, не задерживая обработчик)."""
+        if self._backend is not None:
+            record = json.dumps({"chat_id": job.chat_id, "nm_id": job.nm_id, "replica": REPLICA_ID})
+            asyncio.ensure_future(self._call_backend(self._backend.set(f"job:{job.job_id}", record, JOB_STATE_TTL)))
+
+    def _unpublish(self, job):
+        if self._backend is not None:
+            asyncio.ensure_future(self._call_backend(self._backend.delete(f"job:{job.job_id}")))
+
+    @staticmethod
+    async def _call_backend(call):
+        try:
+            await call
+        except STATE_ERRORS as e:
+            logger.error("State backend call failed: %s", e)
+
+    async def _watch_cancellations(self):
+        """Отменяет свои задания, отмену которых нажали на других репликах."""
+        while True:
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+            for job_id in list(self.jobs):
+                try:
+                    cancelled = await self._backend.get(f"cancel:{job_id}") is not None
+                except STATE_ERRORS as e:
+                    logger.error("Failed to check cancellation signals: %s", e)
+                    break
+                if cancelled and job_id in self.jobs and not self.jobs[job_id].cancel_event.is_set():
+                    self.cancel(job_id)
+
+    def _notify_positions(self):
+        for position, job in enumerate(self.queue_order(), 1):
+            if job.on_queue_position is not None and job._last_position != position:
+                job._last_position = position
+                result = job.on_queue_position(job, position)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+
+    def _next_job(self):
+        for chat_id in list(self._queues):
+            if self._running.get(chat_id, 0) >= self.per_chat_limit:
+                continue
+            queue = self._queues.pop(chat_id)
+            job = queue.popleft()
+            if queue:
+                self._queues[chat_id] = queue  # Чат уходит в конец круга
+            return job
+        return None
+
+    async def _worker(self, worker_idx):
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            self._running[job.chat_id] = self._running.get(job.chat_id, 0) + 1
+            job.status = "running"
+            self._notify_positions()
+            logger.info("Worker %s started search job %s for chat_id=%s", worker_idx, job.job_id, job.chat_id)
+            try:
+                await job.run(job)
+                job.status = "cancelled" if job.cancel_event.is_set() else "done"
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                logger.error("Search job %s failed: %s", job.job_id, e)
+            finally:
+                self._running[job.chat_id] -= 1
+                if not self._running[job.chat_id]:
+                    del self._running[job.chat_id]
+                self.jobs.pop(job.job_id, None)
+                self._unpublish(job)
+                # Освободился слот чата - его следующее задание может стать доступным
+                self._wakeup.set()
+            logger.info("Search job %s finished with status %s", job.job_id, job.status)
+
+job_manager = JobManager()
@@ -1,3 +1,5 @@
+import time
+
 def format_product_info(product_info):
     """Формирует текст сообщения с информацией о товаре."""
     keywords = '\n'.join([f"  • {kw}" for kw in product_info['keywords']]) if product_info['keywords'] else "  Нет ключевых слов"
@@ -17,19 +19,47 @@ def format_product_info(product_info):
     response += f"  🔑 *Ключевые слова*:\n{keywords}\n\n📎Начните поиск по ключевым словам или пришлите новую ссылку!"
     return response
 
+def format_queue_position(position):
+    """Формирует текст сообщения для поиска, ожидающего в очереди."""
+    return f"⏳ Поиск в очереди. Ваша позиция: {position}.\nПоиск начнется автоматически, ожидайте..."
+
 def format_intermediate_results(keyword, keyword_idx, total_keywords, total_products, page, previous_results):
     """Формирует текст промежуточных результатов поиска."""
     message_text = f"📊 Промежуточные результаты ({keyword_idx}/{total_keywords}):\n\n"
     if previous_results:
         message_text += "\n".join(previous_results) + "\n\n"
     message_text += (
-        f"🔎 Ключевое слово \"{keyword}\" (обновление каждые 5 страниц):\n"
+        f"🔎 Ключевое слово \"{keyword}\":\n"
         f"  • Всего товаров в выдаче: {total_products}\n"
         f"  • Текущая страница: {page}\n"
         f"  • Статус: Поиск продолжается, ожидайте..."
     )
     return message_text
 
+def format_keyword_result(idx, keyword, search_result):
+    """Формирует строку результата поиска по одному ключевому слову."""
+    if search_result is None:
+        return f"  {idx}. Ключевое слово \"{keyword}\": ошибка при поиске"
+    position, page, total_products, truncated_at = search_result
+    if position is not None and page is not None:
+        return (
+            f"  {idx}. Ключевое слово \"{keyword}\":\n"
+            f"    • Всего товаров: {total_products}\n"
+            f"    • Позиция в выдаче: {position}\n"
+            f"    • Страница выдачи: {page}"
+        )
+    if truncated_at is not None:
+        return (
+            f"  {idx}. Ключевое слово \"{keyword}\":\n"
+            f"    • Всего товаров: {total_products}\n"
+            f"    • Товар не найден в первых {truncated_at} страницах"
+        )
+    return (
+        f"  {idx}. Ключевое слово \"{keyword}\":\n"
+        f"    • Всего товаров: {total_products}\n"
+        f"    • Товар не найден"
+    )
+
 def format_final_results(results):
     """Формирует текст финальных результатов поиска."""
     return "✅ Поиск завершен!\n\n📎Присылайте новую ссылку для анализа!\n\n📊 Результаты поиска:\n" + "\n".join(results)
@@ -38,4 +68,72 @@ def format_cancelled_results(results):
     """Формирует текст результатов при отмене поиска."""
     if results:
         return "❌ Поиск отменен!\n\n📊 Текущие результаты:\n\n" + "\n".join(results)
-    return "❌ Поиск отменен!\n\n📊 Результатов пока нет."
\ No newline at end of file
+    return "❌ Поиск отменен!\n\n📊 Результатов пока нет."
+
+
+def _format_position(position, total):
+    if position is None:
+        return f"не найден (всего товаров: {total})"
+    return f"{position} из {total}"
+
+def _format_position_delta(position, previous_position):
+    """Изменение позиции: меньший номер - выше в выдаче."""
+    if position is None or previous_position is None:
+        return ""
+    if position < previous_position:
+        return f" (⬆️ {previous_position - position})"
+    if position > previous_position:
+        return f" (⬇️ {position - previous_position})"
+    return " (без изменений)"
+
+def _format_price_line(price, previous_price):
+    old_price, new_price = price
+    line = f"  💰 *Цена*: {new_price} руб."
+    if previous_price is not None and previous_price[1] is not None and new_price is not None and new_price != previous_price[1]:
+        line += f" (было {previous_price[1]} руб.)"
+    return line
+
+def format_subscriptions(subscriptions):
+    """Формирует список подписок чата."""
+    if not subscriptions:
+        return "📭 Подписок нет. Отправьте /track <артикул или ссылка>, чтобы отслеживать позиции товара."
+    lines = ["📋 *Подписки*:\n"]
+    for sub in subscriptions:
+        lines.append(
+            f"  • {sub.nm_id}: ключевых слов {len(sub.keywords)}, каждые {sub.interval / 3600:g} ч."
+        )
+    return "\n".join(lines)
+
+def format_subscription_report(nm_id, report):
+    """Формирует сообщение о плановой проверке подписки."""
+    lines = [f"🔔 *Плановая проверка товара {nm_id}*:\n"]
+    if report["price"] is not None:
+        lines.append(_format_price_line(report["price"], report["previous_price"]))
+    for idx, (keyword, search_result, previous) in enumerate(report["positions"], 1):
+        if search_result is None:
+            lines.append(f"  {idx}. \"{keyword}\": ошибка при поиске")
+            continue
+        position, total_products = search_result.position, search_result.total
+        previous_position = previous[1] if previous is not None else None
+        lines.append(
+            f"  {idx}. \"{keyword}\": {_format_position(position, total_products)}"
+            f"{_format_position_delta(position, previous_position)}"
+        )
+    return "\n".join(lines)
+
+def format_history(nm_id, positions, prices):
+    """Формирует ответ по сохраненной истории: positions - {keyword: [(ts, position, total), ...]}, prices - [(ts, old, new), ...]."""
+    if not positions and not prices:
+        return f"📭 По товару {nm_id} истории пока нет. Подпишитесь командой /track {nm_id}."
+    lines = [f"📈 *История товара {nm_id}*:\n"]
+    if prices:
+        lines.append(_format_price_line(prices[0][1:], prices[1][1:] if len(prices) > 1 else None))
+    for idx, (keyword, points) in enumerate(sorted(positions.items()), 1):
+        ts, position, total_products = points[0]
+        previous_position = points[1][1] if len(points) > 1 else None
+        checked = time.strftime("%d.%m %H:%M", time.localtime(ts))
+        lines.append(
+            f"  {idx}. \"{keyword}\": {_format_position(position, total_products)}"
+            f"{_format_position_delta(position, previous_position)}, {checked}"
+        )
+    return "\n".join(lines)
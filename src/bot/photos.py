@@ -0,0 +1,37 @@
+import logging
+from aiogram.exceptions import TelegramBadRequest
+from parser.cache import TTLCache, get_store
+from .config import PHOTO_CACHE_TTL, PHOTO_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+_photo_cache = None
+
+def get_photo_cache():
+    """Кэш file_id отправленных фотографий: ключ - URL фото на wbbasket.ru."""
+    global _photo_cache
+    if _photo_cache is None:
+        _photo_cache = TTLCache("tg_photo", PHOTO_CACHE_TTL, max_bytes=PHOTO_CACHE_MAX_BYTES, store=get_store())
+    return _photo_cache
+
+async def send_product_photo(bot, chat_id, photo_url, **kwargs):
+    """Отправляет фото товара, по возможности повторно используя file_id Telegram.
+
+    При первой отправке Telegram сам скачивает фото с wbbasket.ru, полученный
+    file_id сохраняется, и последующие отправки того же фото обходятся без
+    обращения к WB. Если сохраненный file_id отклонен, фото отправляется по URL.
+    """
+    cache = get_photo_cache()
+    file_id = await cache.get(photo_url)
+    if file_id is not None:
+        try:
+            return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+        except TelegramBadRequest as e:
+            logger.error("Cached file_id for %s rejected: %s", photo_url, e)
+            await cache.delete(photo_url)
+
+    sent = await bot.send_photo(chat_id=chat_id, photo=photo_url, **kwargs)
+    if sent.photo:
+        # Самый крупный размер идет последним
+        await cache.set(photo_url, sent.photo[-1].file_id)
+    return sent
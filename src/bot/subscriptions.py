@@ -0,0 +1,317 @@
+import asyncio
+import inspect
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from parser.api import get_prices_bulk
+from parser.config import KEYWORD_PARALLELISM, HISTORY_DB_FILE, HISTORY_RETENTION_DAYS
+from parser.history import get_history_store
+from parser.pages import normalize_query
+from parser.search import search_product_by_keywords
+from parser.state import get_state_backend, STATE_ERRORS
+from .config import SUBSCRIPTIONS_PER_CHAT, SCHEDULER_TICK, SCHEDULER_MERGE_WINDOW, SCHEDULER_LOCK_TTL
+
+logger = logging.getLogger(__name__)
+
+# Подписка чата на регулярную проверку позиций товара; interval и next_run - в секундах
+Subscription = namedtuple("Subscription", ["sub_id", "chat_id", "nm_id", "keywords", "interval", "next_run"])
+
+class SubscriptionStore:
+    """Подписки в SQLite (та же база, что и история позиций).
+
+    Как и в HistoryStore, публичные методы - корутины: запросы к SQLite
+    выполняются в потоке (asyncio.to_thread), а не в цикле событий.
+    """
+
+    def __init__(self, path=HISTORY_DB_FILE):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS subscriptions ("
+            "id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, nm_id INTEGER NOT NULL, "
+            "keywords TEXT NOT NULL, interval REAL NOT NULL, next_run REAL NOT NULL, "
+            "UNIQUE (chat_id, nm_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS subscriptions_next_run ON subscriptions (next_run)")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _from_row(row):
+        return Subscription(row[0], row[1], row[2], json.loads(row[3]), row[4], row[5])
+
+    def _upsert(self, chat_id, nm_id, keywords, interval, next_run):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO subscriptions (chat_id, nm_id, keywords, interval, next_run) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (chat_id, nm_id) DO UPDATE SET keywords = excluded.keywords, "
+                "interval = excluded.interval, next_run = excluded.next_run",
+                (chat_id, nm_id, json.dumps(keywords, ensure_ascii=False), interval, next_run)
+            )
+            row = self._conn.execute(
+                "SELECT id, chat_id, nm_id, keywords, interval, next_run FROM subscriptions WHERE chat_id = ? AND nm_id = ?",
+                (chat_id, nm_id)
+            ).fetchone()
+        return self._from_row(row)
+
+    def _delete(self, chat_id, nm_id):
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM subscriptions WHERE chat_id = ? AND nm_id = ?", (chat_id, nm_id)
+            ).rowcount > 0
+
+    def _for_chat(self, chat_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chat_id, nm_id, keywords, interval, next_run FROM subscriptions WHERE chat_id = ? ORDER BY id",
+                (chat_id,)
+            ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def _due(self, until):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chat_id, nm_id, keywords, interval, next_run FROM subscriptions WHERE next_run <= ? ORDER BY next_run",
+                (until,)
+            ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def _reschedule(self, sub_id, next_run):
+        with self._lock:
+            self._conn.execute("UPDATE subscriptions SET next_run = ? WHERE id = ?", (next_run, sub_id))
+
+    async def upsert(self, chat_id, nm_id, keywords, interval, next_run):
+        """Создает подписку или обновляет ключевые слова и интервал существующей."""
+        return await asyncio.to_thread(self._upsert, chat_id, nm_id, keywords, interval, next_run)
+
+    async def delete(self, chat_id, nm_id):
+        """Удаляет подписку; возвращает True, если она была."""
+        return await asyncio.to_thread(self._delete, chat_id, nm_id)
+
+    async def for_chat(self, chat_id):
+        """Подписки чата в порядке создания."""
+        return await asyncio.to_thread(self._for_chat, chat_id)
+
+    async def due(self, until):
+        """Подписки, срок проверки которых наступает не позже until."""
+        return await asyncio.to_thread(self._due, until)
+
+    async def reschedule(self, sub_id, next_run):
+        await asyncio.to_thread(self._reschedule, sub_id, next_run)
+
+class SubscriptionScheduler:
+    """Планировщик регулярных проверок позиций и цен по подпискам.
+
+    Раз в tick секунд выбираются подписки, срок которых наступил. К ним
+    добавляются подписки со сроком в ближайшие merge_window секунд, если у
+    них есть общие ключевые слова: один обход выдачи по запросу отвечает
+    сразу для всех товаров (страницы берутся из общего кэша и снимков
+    выдачи). Первая проверка новой подписки назначается в случайный момент
+    интервала, поэтому проверки распределены по времени, а не идут пачкой.
+    При нескольких репликах каждую итерацию выполняет та, что взяла
+    блокировку в общем хранилище состояния.
+    """
+
+    def __init__(self, store=None, history=None, notify=None, tick=SCHEDULER_TICK,
+                 merge_window=SCHEDULER_MERGE_WINDOW, parallelism=KEYWORD_PARALLELISM):
+        self.store = store
+        self.history = history
+        self.notify = notify  # notify(subscription, report) - функция или корутина
+        self.tick = tick
+        self.merge_window = merge_window
+        self.parallelism = parallelism
+        self.runs = 0
+        self.scans = 0
+        self.merged = 0
+        self._task = None
+        self._last_purge = 0
+
+    def start(self):
+        """Запускает фоновую проверку подписок (вызывается из работающего цикла событий)."""
+        if self._task is None:
+            if self.store is None:
+                self.store = SubscriptionStore()
+            if self.history is None:
+                self.history = get_history_store()
+            self._task = asyncio.ensure_future(self._loop())
+            logger.info("Subscription scheduler started, tick=%ss, merge window=%ss", self.tick, self.merge_window)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def subscribe(self, chat_id, nm_id, keywords, interval, now=None):
+        """Создает подписку; None, если у чата уже максимум подписок."""
+        existing = {sub.nm_id for sub in await self.store.for_chat(chat_id)}
+        if nm_id not in existing and len(existing) >= SUBSCRIPTIONS_PER_CHAT:
+            return None
+        now = time.time() if now is None else now
+        return await self.store.upsert(chat_id, nm_id, list(keywords), interval, now + random.uniform(0, interval))
+
+    async def unsubscribe(self, chat_id, nm_id):
+        return await self.store.delete(chat_id, nm_id)
+
+    def stats(self):
+        return {"runs": self.runs, "scans": self.scans, "merged": self.merged}
+
+    async def _loop(self):
+        backend = get_state_backend()
+        while True:
+            token = None
+            try:
+                token = await backend.acquire_lock("subscriptions", SCHEDULER_LOCK_TTL)
+                if token is not None:
+                    await self._run_with_lease(backend, token)
+            except Exception as e:
+                logger.error("Subscription scheduler iteration failed: %s", e)
+            finally:
+                if token is not None:
+                    try:
+                        await backend.release_lock("subscriptions", token)
+                    except STATE_ERRORS as e:
+                        logger.error("Failed to release subscription scheduler lock: %s", e)
+            await asyncio.sleep(self.tick)
+
+    async def _run_with_lease(self, backend, token):
+        """Выполняет итерацию, продлевая блокировку; при потере блокировки итерация прерывается.
+
+        Иначе долгая итерация пережила бы блокировку, и те же подписки
+        проверила бы другая реплика.
+        """
+        run = asyncio.ensure_future(self._iteration())
+        try:
+            while True:
+                done, _ = await asyncio.wait({run}, timeout=SCHEDULER_LOCK_TTL / 3)
+                if run in done:
+                    return run.result()
+                try:
+                    renewed = await backend.renew_lock("subscriptions", token, SCHEDULER_LOCK_TTL)
+                except STATE_ERRORS as e:
+                    logger.error("Failed to renew subscription scheduler lock: %s", e)
+                    renewed = False
+                if not renewed:
+                    logger.warning("Subscription scheduler lock lost, stopping the current run")
+                    return None
+        finally:
+            if not run.done():
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+
+    async def _iteration(self):
+        await self.run_due()
+        await self._purge_history()
+
+    async def _purge_history(self):
+        now = time.time()
+        if HISTORY_RETENTION_DAYS and now - self._last_purge > 86400:
+            self._last_purge = now
+            await self.history.purge_older_than(now - HISTORY_RETENTION_DAYS * 86400)
+
+    async def plan(self, now):
+        """Подписки для проверки сейчас и обходы выдачи: {запрос: [nm_id, ...]}."""
+        due = await self.store.due(now)
+        if not due:
+            return [], {}
+        due_ids = {sub.sub_id for sub in due}
+        due_queries = {normalize_query(keyword) for sub in due for keyword in sub.keywords}
+        # Подписки с близким сроком берем заранее, если их запросы все равно будут обходиться
+        for sub in await self.store.due(now + self.merge_window):
+            if sub.sub_id not in due_ids and due_queries & {normalize_query(keyword) for keyword in sub.keywords}:
+                due.append(sub)
+                due_ids.add(sub.sub_id)
+                self.merged += 1
+
+        scans = {}
+        for sub in due:
+            for keyword in sub.keywords:
+                nm_ids = scans.setdefault(normalize_query(keyword), [])
+                if sub.nm_id not in nm_ids:
+                    nm_ids.append(sub.nm_id)
+        return due, scans
+
+    async def run_due(self, now=None):
+        """Проверяет подписки, срок которых наступил; возвращает их число."""
+        now = time.time() if now is None else now
+        due, scans = await self.plan(now)
+        if not due:
+            return 0
+        logger.info("Checking %s subscriptions with %s distinct queries", len(due), len(scans))
+
+        results = {}  # (nm_id, запрос) -> результат search_product_by_keywords
+        semaphore = asyncio.Semaphore(self.parallelism)
+
+        async def scan(query, nm_ids):
+            async with semaphore:
+                # Первый товар обходит выдачу; остальные отвечаются по снимку и кэшу страниц,
+                # а если находятся глубже - продолжают обход с места, где он остановился
+                for nm_id in nm_ids:
+                    results[(nm_id, query)] = await search_product_by_keywords(nm_id, query)
+
+        await asyncio.gather(*(scan(query, nm_ids) for query, nm_ids in scans.items()))
+        self.scans += len(scans)
+
+        nm_ids = list(dict.fromkeys(sub.nm_id for sub in due))
+        prices = {}
+        async for record in get_prices_bulk(nm_ids):
+            if record.get("error") is None:
+                prices[record["nm_id"]] = (record["old_price"], record["new_price"])
+
+        # Предыдущие точки нужны для отчета об изменениях, поэтому читаем их до записи новых
+        previous = {sub.sub_id: await self._previous(sub) for sub in due} if self.notify is not None else {}
+        ts = int(now)
+        await self.history.record_positions(
+            [(nm_id, query, result.position, result.total) for (nm_id, query), result in results.items() if result is not None], ts
+        )
+        await self.history.record_prices([(nm_id, old, new) for nm_id, (old, new) in prices.items()], ts)
+
+        for sub in due:
+            await self.store.reschedule(sub.sub_id, self._next_run(sub, now))
+            self.runs += 1
+            if self.notify is not None:
+                report = {
+                    "positions": [
+                        (keyword, results.get((sub.nm_id, normalize_query(keyword))), previous[sub.sub_id]["positions"][keyword])
+                        for keyword in sub.keywords
+                    ],
+                    "price": prices.get(sub.nm_id),
+                    "previous_price": previous[sub.sub_id]["price"]
+                }
+                await self._notify(sub, report)
+        return len(due)
+
+    @staticmethod
+    def _next_run(sub, now):
+        next_run = sub.next_run + sub.interval
+        if next_run <= now:
+            # Проверки пропущены (например, бот был остановлен): не запускаем их все разом
+            next_run = now + random.uniform(0, sub.interval)
+        return next_run
+
+    async def _previous(self, sub):
+        """Последние сохраненные точки подписки: позиция (ts, position, total) по словам и цены."""
+        positions = {}
+        for keyword in sub.keywords:
+            points = await self.history.positions(sub.nm_id, keyword, limit=1)
+            positions[keyword] = points[0] if points else None
+        prices = await self.history.latest_prices(sub.nm_id, limit=1)
+        return {"positions": positions, "price": prices[0][1:] if prices else None}
+
+    async def _notify(self, sub, report):
+        """report: positions - [(keyword, результат поиска, предыдущая точка)], price и previous_price - (old, new)."""
+        try:
+            result = self.notify(sub, report)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.error("Failed to notify chat_id=%s about nm_id=%s: %s", sub.chat_id, sub.nm_id, e)
+
+subscription_scheduler = SubscriptionScheduler()
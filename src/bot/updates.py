@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from parser.ratelimit import AdaptiveRateLimiter
+from parser.metrics import track
+from .config import EDIT_GLOBAL_RATE, EDIT_CHAT_INTERVAL, EDIT_SENDERS
+
+logger = logging.getLogger(__name__)
+
+class MessageUpdateDispatcher:
+    """Фоновая отправка правок сообщений с объединением и лимитами Telegram.
+
+    submit() не ждет Telegram: для каждого сообщения хранится только последнее
+    состояние, правки без изменений пропускаются. Фоновый цикл отправляет их
+    не чаще EDIT_CHAT_INTERVAL в одном чате и EDIT_GLOBAL_RATE на весь бот.
+    """
+
+    def __init__(self, global_rate=EDIT_GLOBAL_RATE, chat_interval=EDIT_CHAT_INTERVAL, senders=EDIT_SENDERS, max_tracked=10000):
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.senders = senders
+        self.max_tracked = max_tracked
+        self.sent = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self._pending = OrderedDict()  # (chat_id, message_id) -> (message, text, reply_markup)
+        self._last_sent = OrderedDict()  # (chat_id, message_id) -> (text, reply_markup)
+        self._inflight = set()
+        self._chat_next = {}  # chat_id -> время, раньше которого чат не правим
+        self._limiter = None
+        self._wakeup = None
+        self._semaphore = None
+        self._task = None
+
+    def start(self):
+        """Запускает фоновый цикл отправки (вызывается из работающего цикла событий)."""
+        if self._task is None:
+            self._limiter = AdaptiveRateLimiter("telegram", self.global_rate, max_rate=self.global_rate)
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.senders)
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def submit(self, message, text, reply_markup=None):
+        """Запоминает новое состояние сообщения; отправка произойдет в фоне."""
+        key = (message.chat.id, message.message_id)
+        state = (text, reply_markup)
+        if key not in self._inflight and self._last_sent.get(key) == state:
+            self._pending.pop(key, None)
+            self.skipped += 1
+            return
+        if key in self._pending:
+            self.coalesced += 1
+        self._pending[key] = (message, text, reply_markup)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def stats(self):
+        return {"pending": len(self._pending), "inflight": len(self._inflight), "sent": self.sent,
+                "skipped": self.skipped, "coalesced": self.coalesced, "rate": self._limiter.rate if self._limiter else None}
+
+    def _next_ready(self, now):
+        """Первое сообщение, которое можно править сейчас, и время до ближайшего готового."""
+        wait = None
+        for key in self._pending:
+            if key in self._inflight:
+                continue
+            ready_at = self._chat_next.get(key[0], 0)
+            if ready_at <= now:
+                return key, 0
+            wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        return None, wait
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            key, wait = self._next_ready(now)
+            if key is None:
+                if not self._pending:
+                    self._chat_next = {chat_id: ready_at for chat_id, ready_at in self._chat_next.items() if ready_at > now}
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._semaphore.acquire()
+            await self._limiter.acquire()
+            if key not in self._pending:
+                self._semaphore.release()  # Пока ждали лимит, правка оказалась не нужна
+                continue
+            message, text, reply_markup = self._pending.pop(key)
+            if self._last_sent.get(key) == (text, reply_markup):
+                self.skipped += 1
+                self._semaphore.release()
+                continue
+            self._inflight.add(key)
+            self._chat_next[key[0]] = time.monotonic() + self.chat_interval
+            asyncio.ensure_future(self._send(key, message, text, reply_markup))
+
+    async def _send(self, key, message, text, reply_markup):
+        try:
+            with track("telegram_edit"):
+                await message.edit_text(text, reply_markup=reply_markup)
+            self.sent += 1
+            self._limiter.on_success()
+            self._remember(key, (text, reply_markup))
+        except TelegramRetryAfter as e:
+            logger.error("Telegram flood control for chat_id=%s, retry after %ss", key[0], e.retry_after)
+            self._limiter.on_throttle(e.retry_after)
+            self._chat_next[key[0]] = time.monotonic() + e.retry_after
+            # Повторяем, если за это время не пришло более новое состояние
+            self._pending.setdefault(key, (message, text, reply_markup))
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                self._remember(key, (text, reply_markup))
+            else:
+                logger.error("Failed to edit message %s: %s", key, e)
+        except Exception as e:
+            logger.error("Failed to edit message %s: %s", key, e)
+        finally:
+            self._inflight.discard(key)
+            self._semaphore.release()
+            self._wakeup.set()
+
+    def _remember(self, key, state):
+        self._last_sent[key] = state
+        self._last_sent.move_to_end(key)
+        while len(self._last_sent) > self.max_tracked:
+            self._last_sent.popitem(last=False)
+
+update_dispatcher = MessageUpdateDispatcher()
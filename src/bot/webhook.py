@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from aiohttp import web
+from aiogram.types import Update
+from parser.metrics import handle_metrics, register_stats
+from .config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_SECRET, WEBHOOK_MAX_CONCURRENCY
+)
+from .jobs import job_manager
+
+logger = logging.getLogger(__name__)
+
+class WebhookServer:
+    """aiohttp-сервер, принимающий обновления Telegram через вебхук.
+
+    Каждое обновление обрабатывается в отдельной задаче; одновременно
+    обрабатывается не больше max_concurrency обновлений, остальные запросы
+    Telegram ждут свободного места (обратное давление вместо очереди в памяти).
+    """
+
+    def __init__(self, bot, dispatcher, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET, max_concurrency=WEBHOOK_MAX_CONCURRENCY):
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.path = path
+        self.secret = secret
+        self.max_concurrency = max_concurrency
+        self.received = 0
+        self.failed = 0
+        self._semaphore = None
+        self._tasks = set()
+
+    def create_app(self):
+        """Создает aiohttp-приложение с маршрутами вебхука и проверки состояния."""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.handle_health)
+        app.router.add_get("/metrics", handle_metrics)
+        register_stats("webhook", lambda: {
+            "updates_received": self.received, "updates_failed": self.failed, "updates_in_progress": len(self._tasks)
+        })
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    async def handle_update(self, request):
+        if self.secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret:
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError as e:
+            logger.error("Invalid webhook update: %s", e)
+            return web.Response(status=400)
+
+        await self._semaphore.acquire()
+        self.received += 1
+        task = asyncio.ensure_future(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response(status=200)
+
+    async def _process(self, update):
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception as e:
+            self.failed += 1
+            logger.error("Failed to process update %s: %s", update.update_id, e)
+        finally:
+            self._semaphore.release()
+
+    async def handle_health(self, request):
+        return web.json_response({
+            "status": "ok",
+            "updates_received": self.received,
+            "updates_failed": self.failed,
+            "updates_in_progress": len(self._tasks),
+            "search_jobs": job_manager.stats()
+        })
+
+    async def _on_shutdown(self, app):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+async def run_webhook(bot, dispatcher, host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+    """Запускает сервер вебхука и регистрирует его в Telegram, если задан WEBHOOK_URL."""
+    server = WebhookServer(bot, dispatcher)
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info("Webhook server listening on %s:%s%s", host, port, server.path)
+    try:
+        if WEBHOOK_URL:
+            await bot.set_webhook(f"{WEBHOOK_URL.rstrip('/')}{server.path}", secret_token=WEBHOOK_SECRET or None)
+            logger.info("Webhook registered at %s", WEBHOOK_URL)
+        await asyncio.Event().wait()  # Работаем до отмены
+    finally:
+        await runner.cleanup()
@@ -1,5 +1,7 @@
-from bot.bot import main
 import asyncio
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    # Импорт внутри блока: процессы пула извлечения ключевых слов (spawn) выполняют
+    # этот файл как __mp_main__ и не должны загружать aiogram и весь бот
+    from bot.bot import main
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from .config import STOP_WORDS, AI_MODEL_NAME, AI_BATCH_WINDOW, AI_MAX_BATCH
+
+logger = logging.getLogger(__name__)
+
+class KeywordModelService:
+    """Резидентная модель KeyBERT, обрабатывающая задания из очереди микробатчами.
+
+    Модель загружается один раз в фоновом потоке. Задания, пришедшие в течение
+    batch_window секунд, объединяются в один вызов extract_keywords.
+    """
+
+    def __init__(self, model_name=AI_MODEL_NAME, batch_window=AI_BATCH_WINDOW, max_batch=AI_MAX_BATCH, top_n=5):
+        self.model_name = model_name
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.top_n = top_n
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._model = None
+        self._batches = 0
+        self._jobs = 0
+        self._busy_time = 0.0
+        self._last_batch_size = 0
+        self._last_batch_latency = 0.0
+
+    def start(self):
+        """Запускает рабочий поток (повторный вызов ничего не делает)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="keybert-worker", daemon=True)
+                self._thread.start()
+
+    def submit(self, text):
+        """Ставит текст в очередь, возвращает concurrent.futures.Future со списком ключевых слов."""
+        self.start()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    async def extract_async(self, text):
+        """Извлекает ключевые слова, не блокируя цикл событий."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stats(self):
+        """Счетчики батчей: количество, средний размер, задержка и пропускная способность."""
+        return {
+            "batches": self._batches,
+            "jobs": self._jobs,
+            "queue_depth": self._queue.qsize(),
+            "avg_batch_size": self._jobs / self._batches if self._batches else 0.0,
+            "last_batch_size": self._last_batch_size,
+            "last_batch_latency": self._last_batch_latency,
+            "avg_batch_latency": self._busy_time / self._batches if self._batches else 0.0,
+            "jobs_per_second": self._jobs / self._busy_time if self._busy_time else 0.0
+        }
+
+    def _load_model(self):
+        start_time = time.time()
+        from keybert import KeyBERT
+        self._model = KeyBERT(model=self.model_name)
+        elapsed_time = time.time() - start_time
+        logger.info("KeyBERT model %s loaded in %.2fs", self.model_name, elapsed_time)
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            self._load_model()
+        except Exception as e:
+            logger.error("Failed to load KeyBERT model: %s", e)
+            load_error = e
+        else:
+            load_error = None
+
+        while True:
+            # После set_running_or_notify_cancel задание нельзя отменить, поэтому результат
+            # записывается без гонки с cancel(); уже отмененные задания пропускаются
+            batch = [(text, future) for text, future in self._collect_batch() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            if load_error is not None:
+                for _, future in batch:
+                    future.set_exception(load_error)
+                continue
+            self._process(batch)
+
+    def _process(self, batch):
+        docs = [text for text, _ in batch]
+        start_time = time.time()
+        try:
+            results = self._model.extract_keywords(
+                docs,
+                keyphrase_ngram_range=(1, 2),
+                stop_words=list(STOP_WORDS),
+                top_n=self.top_n,
+                diversity=0.5
+            )
+            # Для одного документа KeyBERT возвращает плоский список
+            if len(docs) == 1:
+                results = [results]
+        except Exception as e:
+            logger.error("Error in KeyBERT batch of %s: %s", len(docs), e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        elapsed_time = time.time() - start_time
+        self._batches += 1
+        self._jobs += len(batch)
+        self._busy_time += elapsed_time
+        self._last_batch_size = len(batch)
+        self._last_batch_latency = elapsed_time
+        logger.info("KeyBERT batch of %s processed in %.2fs", len(batch), elapsed_time)
+        for (_, future), keywords in zip(batch, results):
+            future.set_result([kw[0] for kw in keywords])
+
+_service = None
+
+def get_model_service():
+    """Возвращает общий экземпляр KeywordModelService (создается лениво)."""
+    global _service
+    if _service is None:
+        _service = KeywordModelService()
+    return _service
@@ -1,90 +1,92 @@
-import requests
-import time
-from .config import logger
+import asyncio
+import logging
+from .config import PRICE_BASE_URL, PRICE_BULK_CHUNK, PRICE_BULK_CONCURRENCY
+from .http import fetch_json, HTTP_ERRORS
+from .decode import loads
+from .basket import get_resolver
+from .metrics import track
 
-def get_basket(nm_id, vol, part, basket_num=24, max_basket=30):
-    logger.info(f"get_basket called with nm_id={nm_id}, vol={vol}, part={part}, basket_num={basket_num}")
+logger = logging.getLogger(__name__)
 
-    # Диапазоны для basket-01 до basket-22, полный рандом, хардкодом задается
-    ranges = [
-        (0, 143, "01"), (144, 287, "02"), (288, 431, "03"),
-        (432, 719, "04"), (720, 1007, "05"), (1008, 1061, "06"),
-        (1062, 1115, "07"), (1116, 1169, "08"), (1170, 1313, "09"),
-        (1314, 1601, "10"), (1602, 1655, "11"), (1656, 1919, "12"),
-        (1920, 2045, "13"), (2046, 2189, "14"), (2190, 2405, "15"),
-        (2406, 2621, "16"), (2622, 2837, "17"), (2838, 3053, "18"),
-        (3054, 3269, "19"), (3270, 3485, "20"), (3486, 3701, "21"),
-        (3702, 3917, "22")
-    ]
+async def get_basket(nm_id, vol, part):
+    """Возвращает (basket, данные card.json) для товара или (None, None)."""
+    logger.info("get_basket called with nm_id=%s, vol=%s, part=%s", nm_id, vol, part)
+    return await get_resolver().resolve(nm_id, vol, part)
+
+def _to_rub(value):
+    return value / 100 if value else None
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124'
+def parse_price_product(product):
+    """Запись о ценах товара из ответа card.wb.ru: цены по всем размерам и цены первого размера."""
+    sizes = []
+    for size in product.get("sizes", []):
+        price_data = size.get("price", {})
+        sizes.append({
+            "name": size.get("name", ""),
+            "old_price": _to_rub(price_data.get("basic")),
+            "new_price": _to_rub(price_data.get("product"))
+        })
+    return {
+        "nm_id": product.get("id"),
+        "sizes": sizes,
+        "old_price": sizes[0]["old_price"] if sizes else None,
+        "new_price": sizes[0]["new_price"] if sizes else None
     }
 
-    basket = None
-    if vol <= 3917:
-        logger.info(f"vol={vol} <= 3917, checking ranges")
-        for start, end, basket_suffix in ranges:
-            if start <= vol <= end:
-                basket = f"basket-{basket_suffix}"
-                logger.info(f"Found matching range {start}-{end}, using {basket}")
-                break
-        if not basket:
-            basket = "basket-23"
-            logger.info(f"vol={vol} <= 3917 but no range matched, defaulting to {basket}")
-    else:
-        logger.info(f"vol={vol} > 3917, starting with basket-23 or searching at basket_num={basket_num}")
-        if basket_num > max_basket:
-            logger.error(f"Exhausted basket search up to basket_num={basket_num}")
-            return None, None
-        basket = f"basket-{basket_num:02d}" if basket_num > 23 else "basket-23"
+def parse_price_response(raw):
+    """Декодирует ответ card.wb.ru сразу в записи о ценах: nm_id -> запись."""
+    products = loads(raw).get("data", {}).get("products", [])
+    return {record["nm_id"]: record for record in map(parse_price_product, products)}
 
-    json_url = f"https://{basket}.wbbasket.ru/vol{vol}/part{part}/{nm_id}/info/ru/card.json"
-    logger.info(f"Attempting request to {json_url}")
-    start_time = time.time()
-    try:
-        time.sleep(1)  # Задержка для предотвращения блокировок
-        response = requests.get(json_url, headers=headers, timeout=5)
-        response.raise_for_status()
-        elapsed_time = time.time() - start_time
-        logger.info(f"Request to {json_url} succeeded, took {elapsed_time:.2f}s")
-        return basket, response.json()
-    except requests.RequestException as e:
-        elapsed_time = time.time() - start_time
-        logger.error(f"Request to {json_url} failed after {elapsed_time:.2f}s: {str(e)}")
-        if vol > 3917 and basket == "basket-23":
-            logger.info(f"Proceeding to next basket_num={basket_num}")
-            return get_basket(nm_id, vol, part, basket_num, max_basket)
-        return None, None
+async def _fetch_price_chunk(chunk, semaphore):
+    """Запрашивает цены для группы артикулов одним запросом."""
+    price_url = f"{PRICE_BASE_URL}&nm={';'.join(str(nm_id) for nm_id in chunk)}"
+    async with semaphore:
+        logger.info("Attempting price request for %s articles: %s", len(chunk), price_url)
+        try:
+            with track("price") as timer:
+                records = await fetch_json(price_url, parse=parse_price_response)
+            logger.info("Price request for %s articles succeeded, took %.2fs, found %s", len(chunk), timer.elapsed, len(records))
+        except HTTP_ERRORS as e:
+            logger.error("Price request to %s failed after %.2fs: %s", price_url, timer.elapsed, e)
+            return [{"nm_id": nm_id, "sizes": [], "old_price": None, "new_price": None, "error": str(e)} for nm_id in chunk]
+        except (KeyError, IndexError, ValueError, AttributeError) as e:
+            logger.error("Error parsing price response for %s: %s", price_url, e)
+            return [{"nm_id": nm_id, "sizes": [], "old_price": None, "new_price": None, "error": str(e)} for nm_id in chunk]
 
-def get_prices(nm_id):
-    logger.info(f"get_prices called with nm_id={nm_id}")
-    price_url = f"https://card.wb.ru/cards/v2/detail?appType=1&curr=rub&dest=-1257786&spp=30&ab_testing=false&lang=ru&nm={nm_id}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124'
-    }
-    logger.info(f"Attempting price request to {price_url}")
-    start_time = time.time()
+    result = []
+    for nm_id in chunk:
+        if nm_id in records:
+            result.append(records[nm_id])
+        else:
+            logger.error("No products or sizes found in price response for nm_id=%s", nm_id)
+            result.append({"nm_id": nm_id, "sizes": [], "old_price": None, "new_price": None})
+    return result
+
+async def get_prices_bulk(nm_ids, chunk_size=PRICE_BULK_CHUNK, concurrency=PRICE_BULK_CONCURRENCY):
+    """Асинхронный генератор записей о ценах для списка артикулов.
+
+    Артикулы объединяются в запросы по chunk_size штук, не более concurrency
+    запросов выполняются одновременно. Записи отдаются по мере готовности
+    групп, поэтому их порядок может отличаться от порядка nm_ids.
+    """
+    nm_ids = list(dict.fromkeys(int(nm_id) for nm_id in nm_ids))
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [
+        asyncio.ensure_future(_fetch_price_chunk(nm_ids[i:i + chunk_size], semaphore))
+        for i in range(0, len(nm_ids), chunk_size)
+    ]
     try:
-        time.sleep(1)  # Задержка для предотвращения блокировок
-        response = requests.get(price_url, headers=headers, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        products = data.get("data", {}).get("products", [])
-        if not products or not products[0].get("sizes"):
-            logger.error(f"No products or sizes found in price response for nm_id={nm_id}")
-            return None, None
-        price_data = products[0]["sizes"][0].get("price", {})
-        old_price = price_data.get("basic", 0) / 100 if price_data.get("basic") else None
-        new_price = price_data.get("product", 0) / 100 if price_data.get("product") else None
-        elapsed_time = time.time() - start_time
-        logger.info(f"Price request to {price_url} succeeded, took {elapsed_time:.2f}s, old_price={old_price}, new_price={new_price}")
-        return old_price, new_price
-    except requests.RequestException as e:
-        elapsed_time = time.time() - start_time
-        logger.error(f"Price request to {price_url} failed after {elapsed_time:.2f}s: {str(e)}")
-        return None, None
-    except (KeyError, IndexError) as e:
-        elapsed_time = time.time() - start_time
-        logger.error(f"Error parsing price response for nm_id={nm_id}: {str(e)}")
-        return None, None
\ No newline at end of file
+        for next_done in asyncio.as_completed(tasks):
+            for record in await next_done:
+                yield record
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def get_prices(nm_id):
+    """Возвращает (old_price, new_price) товара по первому размеру."""
+    logger.info("get_prices called with nm_id=%s", nm_id)
+    async for record in get_prices_bulk([nm_id]):
+        return record["old_price"], record["new_price"]
+    return None, None
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import os
+from bisect import bisect_left, bisect_right
+from .config import MAX_BASKET, BASKET_PROBE_WIDTH, BASKET_PROBE_TIMEOUT, BASKET_MAP_FILE, BASKET_BASE_URL
+from .http import fetch_json, HTTP_ERRORS
+from .decode import parse_card
+from .metrics import track
+from .logs import SAMPLED
+
+logger = logging.getLogger(__name__)
+
+# Известные диапазоны vol для basket-01 до basket-22 (начальное заполнение таблицы границ)
+STATIC_RANGES = [
+    (0, 143, 1), (144, 287, 2), (288, 431, 3),
+    (432, 719, 4), (720, 1007, 5), (1008, 1061, 6),
+    (1062, 1115, 7), (1116, 1169, 8), (1170, 1313, 9),
+    (1314, 1601, 10), (1602, 1655, 11), (1656, 1919, 12),
+    (1920, 2045, 13), (2046, 2189, 14), (2190, 2405, 15),
+    (2406, 2621, 16), (2622, 2837, 17), (2838, 3053, 18),
+    (3054, 3269, 19), (3270, 3485, 20), (3486, 3701, 21),
+    (3702, 3917, 22)
+]
+
+def basket_host(basket_num):
+    """Имя корзины по номеру: 7 -> basket-07."""
+    return f"basket-{basket_num:02d}"
+
+def product_url(basket, vol, part, nm_id):
+    """Базовый URL файлов товара в корзине (card.json, фотографии)."""
+    return f"{BASKET_BASE_URL.format(basket=basket)}/vol{vol}/part{part}/{nm_id}"
+
+def card_url(basket, vol, part, nm_id):
+    """URL card.json товара в указанной корзине."""
+    return f"{product_url(basket, vol, part, nm_id)}/info/ru/card.json"
+
+class BasketResolver:
+    """Определяет корзину товара по vol.
+
+    Хранит отсортированную таблицу точек (vol, номер корзины). Номер корзины
+    не убывает с ростом vol, поэтому если соседние точки слева и справа от vol
+    указывают на одну корзину, ответ известен без перебора. Иначе кандидаты
+    (корзины между соседями) проверяются параллельно, а найденная точка
+    запоминается и сохраняется на диск.
+    """
+
+    def __init__(self, map_file=BASKET_MAP_FILE, max_basket=MAX_BASKET, probe_width=BASKET_PROBE_WIDTH):
+        self.map_file = map_file
+        self.max_basket = max_basket
+        self.probe_width = probe_width
+        self._vols = []
+        self._baskets = []
+        for start, end, basket_num in STATIC_RANGES:
+            self._insert(start, basket_num)
+            self._insert(end, basket_num)
+        self._load()
+
+    def _load(self):
+        if not self.map_file or not os.path.exists(self.map_file):
+            return
+        try:
+            with open(self.map_file, encoding="utf-8") as f:
+                points = json.load(f).get("points", [])
+            for vol, basket_num in points:
+                self._insert(int(vol), int(basket_num))
+            logger.info("Loaded %s basket map points from %s", len(points), self.map_file)
+        except (OSError, ValueError, TypeError) as e:
+            logger.error("Failed to load basket map from %s: %s", self.map_file, e)
+
+    def save(self):
+        """Атомарно сохраняет таблицу точек в map_file."""
+        if not self.map_file:
+            return
+        tmp_file = f"{self.map_file}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.map_file) or ".", exist_ok=True)
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"points": list(zip(self._vols, self._baskets))}, f)
+            os.replace(tmp_file, self.map_file)
+        except OSError as e:
+            logger.error("Failed to save basket map to %s: %s", self.map_file, e)
+
+    def _insert(self, vol, basket_num):
+        """Добавляет точку, удаляя противоречащие монотонности и лишние точки."""
+        i = bisect_left(self._vols, vol)
+        if i < len(self._vols) and self._vols[i] == vol:
+            if self._baskets[i] == basket_num:
+                return False
+            del self._vols[i], self._baskets[i]
+        # Слева не может быть корзины с большим номером, справа - с меньшим
+        lo = i
+        while lo > 0 and self._baskets[lo - 1] > basket_num:
+            lo -= 1
+        hi = i
+        while hi < len(self._vols) and self._baskets[hi] < basket_num:
+            hi += 1
+        del self._vols[lo:hi], self._baskets[lo:hi]
+        self._vols.insert(lo, vol)
+        self._baskets.insert(lo, basket_num)
+        # Точка внутри отрезка одной корзины ничего не добавляет к таблице
+        for j in (lo + 1, lo, lo - 1):
+            if 0 < j < len(self._vols) - 1 and self._baskets[j - 1] == self._baskets[j] == self._baskets[j + 1]:
+                del self._vols[j], self._baskets[j]
+        return True
+
+    def lookup(self, vol):
+        """Возвращает список корзин-кандидатов для vol (один элемент, если корзина известна)."""
+        i = bisect_right(self._vols, vol)
+        if i > 0 and self._vols[i - 1] == vol:
+            return [self._baskets[i - 1]]
+        low = self._baskets[i - 1] if i > 0 else 1
+        high = self._baskets[i] if i < len(self._vols) else self.max_basket
+        return list(range(low, max(low, high) + 1))
+
+    def learn(self, vol, basket_num):
+        """Запоминает, что vol находится в корзине basket_num."""
+        if self._insert(vol, basket_num):
+            logger.info("Learned basket mapping vol=%s -> %s", vol, basket_host(basket_num))
+            self.save()
+
+    async def _probe(self, basket_num, vol, part, nm_id):
+        url = card_url(basket_host(basket_num), vol, part, nm_id)
+        return basket_num, await fetch_json(url, timeout=BASKET_PROBE_TIMEOUT, parse=parse_card)
+
+    async def _probe_many(self, candidates, vol, part, nm_id):
+        """Проверяет корзины параллельно; возвращает первую успешную, остальные отменяет."""
+        tasks = {asyncio.ensure_future(self._probe(b, vol, part, nm_id)) for b in candidates}
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        return task.result()
+                    except (*HTTP_ERRORS, ValueError) as e:
+                        logger.info("Basket probe failed for nm_id=%s: %s", nm_id, e, extra=SAMPLED)
+            return None, None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def resolve(self, nm_id, vol, part):
+        """Находит корзину товара и возвращает (basket, данные card.json) или (None, None)."""
+        with track("basket") as timer:
+            candidates = self.lookup(vol)
+            logger.info("Resolving basket for nm_id=%s, vol=%s: candidates=%s", nm_id, vol, candidates)
+            if len(candidates) == 1:
+                # Если известная корзина не ответила, таблица могла устареть - проверяем ближайшие корзины правее
+                fallback = list(range(candidates[0] + 1, min(candidates[0] + self.probe_width, self.max_basket) + 1))
+                batches = [candidates, fallback] if fallback else [candidates]
+            else:
+                batches = [candidates[i:i + self.probe_width] for i in range(0, len(candidates), self.probe_width)]
+
+            for batch in batches:
+                basket_num, data = await self._probe_many(batch, vol, part, nm_id)
+                if data is not None:
+                    self.learn(vol, basket_num)
+                    logger.info("Resolved %s for nm_id=%s in %.2fs", basket_host(basket_num), nm_id, timer.elapsed)
+                    return basket_host(basket_num), data
+
+            logger.error("Exhausted basket search for nm_id=%s, vol=%s", nm_id, vol)
+            return None, None
+
+_resolver = None
+
+def get_resolver():
+    """Возвращает общий экземпляр BasketResolver (создается лениво)."""
+    global _resolver
+    if _resolver is None:
+        _resolver = BasketResolver()
+    return _resolver
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from .config import CACHE_MAX_BYTES, CACHE_DB_FILE
+from .metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+class SqliteStore:
+    """Хранилище записей кэша на диске (SQLite), переживающее перезапуск.
+
+    Как и в HistoryStore, публичные методы - корутины: запросы к SQLite
+    выполняются в потоке (asyncio.to_thread), а не в цикле событий.
+    Открытие базы и очистка устаревших записей выполняются в конструкторе,
+    поэтому создавать хранилище лучше тоже вне цикла (см. open_store).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._lock = threading.Lock()
+        self._purge_expired()
+
+    def _get(self, namespace, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _set(self, namespace, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+
+    def _delete(self, namespace, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def _purge_expired(self):
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        if deleted:
+            logger.info("Purged %s expired cache entries from %s", deleted, self.path)
+
+    async def get(self, namespace, key):
+        """Возвращает (value, expires_at) или None, если записи нет или она устарела."""
+        return await asyncio.to_thread(self._get, namespace, key)
+
+    async def set(self, namespace, key, value, expires_at):
+        await asyncio.to_thread(self._set, namespace, key, value, expires_at)
+
+    async def delete(self, namespace, key):
+        await asyncio.to_thread(self._delete, namespace, key)
+
+    async def purge_expired(self):
+        """Удаляет устаревшие записи."""
+        await asyncio.to_thread(self._purge_expired)
+
+def json_size(value):
+    """Приблизительный размер значения - длина его JSON-представления."""
+    return len(json.dumps(value, ensure_ascii=False))
+
+class TTLCache:
+    """LRU-кэш в памяти с TTL и ограничением по приблизительному объему.
+
+    Размер записи оценивается функцией size_of (по умолчанию по длине JSON).
+    При наличии store записи дублируются на диск и подгружаются из него после
+    перезапуска; в этом случае значения должны сериализоваться в JSON.
+    Методы - корутины ради обращений к store; попадание в память и кэш без
+    store выполняются без приостановки, поэтому между проверкой кэша и
+    следующим действием вызывающего кода другие задачи не вклиниваются.
+    """
+
+    def __init__(self, namespace, ttl, max_bytes=CACHE_MAX_BYTES, store=None, size_of=json_size):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.store = store
+        self.size_of = size_of
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        register_cache(namespace, self.stats)
+
+    async def get(self, key):
+        """Возвращает значение или None, если его нет или оно устарело."""
+        key = str(key)
+        entry = self._data.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._remove(key)
+        if self.store is not None:
+            stored = await self.store.get(self.namespace, key)
+            if stored is not None:
+                value, expires_at = stored
+                self._put(key, value, expires_at)
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key, value, ttl=None):
+        """Сохраняет значение на ttl секунд (по умолчанию self.ttl)."""
+        key = str(key)
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._put(key, value, expires_at)
+        if self.store is not None:
+            await self.store.set(self.namespace, key, value, expires_at)
+
+    async def delete(self, key):
+        key = str(key)
+        self._remove(key)
+        if self.store is not None:
+            await self.store.delete(self.namespace, key)
+
+    def stats(self):
+        """Попадания, промахи, число записей и занятый объем."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._data), "bytes": self._bytes}
+
+    def _put(self, key, value, expires_at):
+        self._remove(key)
+        size = self.size_of(value)
+        self._data[key] = (expires_at, value, size)
+        self._bytes += size
+        # Вытесняем давно не использованные записи, пока не уложимся в лимит
+        while self._bytes > self.max_bytes and len(self._data) > 1:
+            oldest_key = next(iter(self._data))
+            self._remove(oldest_key)
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+_store = None
+_store_initialized = False
+
+def get_store():
+    """Возвращает общее SQLite-хранилище (None, если CACHE_DB_FILE не задан или недоступен)."""
+    global _store, _store_initialized
+    if not _store_initialized:
+        _store_initialized = True
+        if CACHE_DB_FILE:
+            try:
+                _store = SqliteStore(CACHE_DB_FILE)
+                logger.info("Using on-disk cache at %s", CACHE_DB_FILE)
+            except (OSError, sqlite3.Error) as e:
+                logger.error("Failed to open on-disk cache %s: %s", CACHE_DB_FILE, e)
+    return _store
+
+async def open_store():
+    """Открывает общее хранилище в потоке, чтобы открытие и очистка базы не задерживали цикл событий."""
+    return await asyncio.to_thread(get_store)
@@ -1,37 +1,27 @@
 import logging
+import multiprocessing
 import os
-from logging.handlers import RotatingFileHandler
+import secrets
+from .logs import setup_logging, parse_levels
+
+# Настройка логирования: запись через очередь в фоновом потоке (см. parser/logs.py)
+LOG_DIR = os.getenv("LOG_DIR", "/app/logs")
+LOG_FILE = os.path.join(LOG_DIR, "parser.log") if LOG_DIR else ""
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = parse_levels(os.getenv("LOG_LEVELS", ""))  # Уровни подсистем, например "parser.search=WARNING,aiogram=WARNING"
+LOG_SAMPLE_INTERVAL = float(os.getenv("LOG_SAMPLE_INTERVAL", "10"))  # Окно ограничения одинаковых сообщений, секунды
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "20"))  # Одинаковых INFO-сообщений за окно (0 - без ограничения)
+
+# Дочерние процессы пула получают обработчик, пересылающий записи в родительский процесс
+if multiprocessing.parent_process() is None:
+    setup_logging(LOG_FILE, LOG_LEVEL, LOG_LEVELS, LOG_SAMPLE_INTERVAL, LOG_SAMPLE_BURST)
 
 # Диагностический лог при загрузке модуля
 logger = logging.getLogger(__name__)
 logger.info("Starting parser/config.py module initialization")
 
-# Настройка логирования
-log_dir = "/app/logs"
-try:
-    os.makedirs(log_dir, exist_ok=True)
-    logger.info(f"Created log directory: {log_dir}")
-except Exception as e:
-    logger.error(f"Failed to create log directory {log_dir}: {str(e)}")
-
-log_file = os.path.join(log_dir, "parser.log")
-file_handler = RotatingFileHandler(
-    log_file,
-    maxBytes=10*1024*1024,  # 10 МБ
-    backupCount=5  # Хранить до 5 резервных копий
-)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        file_handler
-    ]
-)
-
 use_ai_raw = os.getenv("USE_AI", "false")
-logger.info(f"Environment variable USE_AI: {use_ai_raw}")
+logger.info("Environment variable USE_AI: %s", use_ai_raw)
 
 STOP_WORDS = {
     "и", "с", "для", "в", "на", "от", "по", "не", "при", "а", "но", "или", "что",
@@ -40,15 +30,88 @@ STOP_WORDS = {
     "каждый", "любой", "другой", "этот", "тот", "самый", "какой", "какая", "какое"
 }
 
-# Константы для поиска
-SEARCH_BASE_URL = (
+# Константы для поиска (адреса WB можно переопределить, например для локальной замены в бенчмарках)
+SEARCH_BASE_URL = os.getenv("SEARCH_BASE_URL", (
     "https://search.wb.ru/exactmatch/ru/common/v13/search?"
     "ab_testing=false&appType=1&curr=rub&dest=-1257786&hide_dtype=13&"
     "lang=ru&resultset=catalog&sort=popular&spp=30&suppressSpellcheck=false"
-)
-SEARCH_HEADERS = {
+))
+MAX_SEARCH_PAGES = 100
+SEARCH_PAGE_SIZE = 100  # Товаров на одной странице выдачи
+SEARCH_WINDOW = int(os.getenv("SEARCH_WINDOW", "6"))  # Страниц одного ключевого слова в полете
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "16"))  # Общий лимит запросов выдачи в полете
+KEYWORD_PARALLELISM = int(os.getenv("KEYWORD_PARALLELISM", "3"))  # Ключевых слов одного товара одновременно
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))  # Сколько секунд страница выдачи считается свежей
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RANKING_SNAPSHOT_TTL = int(os.getenv("RANKING_SNAPSHOT_TTL", "900"))  # Свежесть снимка выдачи по запросу
+RANKING_MAX_BYTES = int(os.getenv("RANKING_MAX_BYTES", str(32 * 1024 * 1024)))  # Лимит памяти на все снимки выдачи
+SEARCH_JOB_PAGE_BUDGET = int(os.getenv("SEARCH_JOB_PAGE_BUDGET", "200"))  # Страниц выдачи на один поиск по всем словам (0 - без ограничения)
+
+# Константы для получения цен
+PRICE_BASE_URL = os.getenv("PRICE_BASE_URL", (
+    "https://card.wb.ru/cards/v2/detail?"
+    "appType=1&curr=rub&dest=-1257786&spp=30&ab_testing=false&lang=ru"
+))
+PRICE_BULK_CHUNK = int(os.getenv("PRICE_BULK_CHUNK", "100"))  # Артикулов в одном запросе
+PRICE_BULK_CONCURRENCY = int(os.getenv("PRICE_BULK_CONCURRENCY", "4"))  # Одновременных запросов
+
+# Настройки HTTP-клиента (общий пул keep-alive соединений)
+HTTP_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124'
 }
-MAX_SEARCH_PAGES = 100
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))  # Всего соединений в пуле
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))  # Соединений на один хост
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))  # Повторы после 429/5xx
+
+# Ограничение частоты запросов к хостам WB (запросов в секунду), формат "хост=скорость,..."
+RATE_LIMITS = {
+    host.strip(): float(rate)
+    for host, rate in (
+        item.split("=") for item in os.getenv(
+            "RATE_LIMITS", "wbbasket.ru=20,card.wb.ru=5,search.wb.ru=10"
+        ).split(",") if item.strip()
+    )
+}
+RATE_LIMIT_DEFAULT = float(os.getenv("RATE_LIMIT_DEFAULT", "5"))  # Для остальных хостов
+RATE_LIMIT_MIN = float(os.getenv("RATE_LIMIT_MIN", "0.5"))
+RATE_LIMIT_MAX = float(os.getenv("RATE_LIMIT_MAX", "50"))
+
+# Настройки определения корзины (basket-NN) по vol
+BASKET_BASE_URL = os.getenv("BASKET_BASE_URL", "https://{basket}.wbbasket.ru")  # {basket} заменяется на basket-NN
+MAX_BASKET = int(os.getenv("MAX_BASKET", "30"))
+BASKET_PROBE_WIDTH = int(os.getenv("BASKET_PROBE_WIDTH", "4"))  # Сколько корзин проверять одновременно
+BASKET_PROBE_TIMEOUT = float(os.getenv("BASKET_PROBE_TIMEOUT", "3"))
+BASKET_MAP_FILE = os.getenv("BASKET_MAP_FILE", "/app/config/basket_map.json")
+
+# Размер LRU-кэша лемм pymorphy2
+LEMMA_CACHE_SIZE = int(os.getenv("LEMMA_CACHE_SIZE", "50000"))
+
+# Настройки ИИ-извлечения ключевых слов (KeyBERT)
+AI_MODEL_PATH = os.getenv("AI_MODEL_PATH", "")  # Локальная копия модели, скачанная при сборке образа
+AI_MODEL_NAME = AI_MODEL_PATH if AI_MODEL_PATH and os.path.isdir(AI_MODEL_PATH) else "sentence-transformers/all-MiniLM-L6-v2"
+AI_BATCH_WINDOW = float(os.getenv("AI_BATCH_WINDOW", "0.05"))  # Сколько секунд собирать задания в один батч
+AI_MAX_BATCH = int(os.getenv("AI_MAX_BATCH", "16"))
+
+# Количество процессов для извлечения ключевых слов (0 - выполнять в текущем процессе)
+KEYWORD_WORKERS = int(os.getenv("KEYWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Кэш карточек и цен товаров
+CARD_CACHE_TTL = int(os.getenv("CARD_CACHE_TTL", str(24 * 3600)))  # Карточка меняется редко
+PRICE_CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", "300"))  # Цены меняются часто
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # Лимит памяти на один кэш
+CACHE_DB_FILE = os.getenv("CACHE_DB_FILE", "/app/config/cache.sqlite3")  # Пустая строка - без хранения на диске
+
+# Общее состояние реплик (см. parser/state.py): memory:// - один экземпляр, redis://хост:6379/0 - несколько
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", "memory://")
+STATE_TIMEOUT = float(os.getenv("STATE_TIMEOUT", "2"))
+STATE_LOCK_TTL = float(os.getenv("STATE_LOCK_TTL", "20"))  # Аренда блокировки загрузки страницы выдачи, секунды
+STATE_POLL_INTERVAL = float(os.getenv("STATE_POLL_INTERVAL", "0.05"))  # Опрос результата, который загружает другая реплика
+REPLICA_ID = os.getenv("REPLICA_ID") or secrets.token_hex(3)  # Входит в ID заданий, чтобы они не совпадали у реплик
+
+# История позиций и цен (см. parser/history.py)
+HISTORY_DB_FILE = os.getenv("HISTORY_DB_FILE", "/app/config/history.sqlite3")
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "180"))  # 0 - хранить без ограничения
 
 logger.info("parser/config.py module initialization completed")
\ No newline at end of file
@@ -0,0 +1,30 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Быстрый JSON-бэкенд: orjson, если установлен, иначе стандартный json
+try:
+    import orjson
+
+    def loads(raw):
+        """Декодирует JSON из bytes или str."""
+        return orjson.loads(raw)
+
+    JSON_BACKEND = "orjson"
+except ImportError:
+    def loads(raw):
+        """Декодирует JSON из bytes или str."""
+        return json.loads(raw)
+
+    JSON_BACKEND = "json"
+
+logger.info("Using JSON backend: %s", JSON_BACKEND)
+
+# Поля card.json, которые используются при разборе карточки
+CARD_FIELDS = ("imt_name", "nm_id", "description", "selling", "media", "options", "compositions")
+
+def parse_card(raw):
+    """Декодирует card.json и оставляет только используемые поля."""
+    data = loads(raw)
+    return {field: data[field] for field in CARD_FIELDS if field in data}
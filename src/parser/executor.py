@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from .config import KEYWORD_WORKERS, LOG_LEVEL, LOG_LEVELS, LOG_SAMPLE_INTERVAL, LOG_SAMPLE_BURST
+from .logs import get_worker_queue, setup_worker_logging
+from .keywords import extract_keywords_manual
+from .morph import warm_up
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+def _init_worker(log_queue):
+    """Инициализатор процесса: пересылает логи родителю и загружает словари pymorphy2 один раз на процесс."""
+    if log_queue is not None:
+        setup_worker_logging(log_queue, LOG_LEVEL, LOG_LEVELS, LOG_SAMPLE_INTERVAL, LOG_SAMPLE_BURST)
+    warm_up()
+
+def _ping():
+    return os.getpid()
+
+def get_pool():
+    """Возвращает общий пул процессов для извлечения ключевых слов (None, если KEYWORD_WORKERS=0)."""
+    global _pool
+    if _pool is None and KEYWORD_WORKERS > 0:
+        # spawn: процессы не наследуют потоки и сокеты цикла событий родителя
+        mp_context = multiprocessing.get_context("spawn")
+        _pool = ProcessPoolExecutor(
+            max_workers=KEYWORD_WORKERS,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(get_worker_queue(mp_context),)
+        )
+        logger.info("Created keyword extraction process pool with %s workers", KEYWORD_WORKERS)
+    return _pool
+
+async def start_pool():
+    """Запускает все процессы пула заранее, чтобы первый запрос не ждал их загрузки."""
+    pool = get_pool()
+    if pool is None:
+        await asyncio.to_thread(warm_up)
+        return
+    loop = asyncio.get_running_loop()
+    pids = await asyncio.gather(*[loop.run_in_executor(pool, _ping) for _ in range(KEYWORD_WORKERS)])
+    logger.info("Keyword extraction pool warmed up, worker pids: %s", sorted(set(pids)))
+
+def shutdown_pool():
+    """Останавливает пул процессов."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        logger.info("Keyword extraction process pool shut down")
+
+async def extract_keywords_manual_async(data, title):
+    """Выполняет extract_keywords_manual в пуле процессов, не блокируя цикл событий."""
+    pool = get_pool()
+    if pool is None:
+        return extract_keywords_manual(data, title)
+    # В процесс передаются только поля, нужные для извлечения ключевых слов
+    slim_data = {"options": data.get("options", []), "compositions": data.get("compositions", [])}
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, extract_keywords_manual, slim_data, title)
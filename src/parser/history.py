@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from .config import HISTORY_DB_FILE
+from .pages import normalize_query
+
+logger = logging.getLogger(__name__)
+
+class HistoryStore:
+    """История позиций и цен товаров в SQLite.
+
+    Позиции хранятся по ключу (nm_id, keyword, ts) в таблице WITHOUT ROWID:
+    точки одного товара и запроса лежат рядом, а выборка истории и
+    последних значений идет по первичному ключу без отдельного индекса.
+
+    Публичные методы - корутины: запросы к SQLite выполняются в потоке
+    (asyncio.to_thread) и не блокируют цикл событий на время записи на диск.
+    """
+
+    def __init__(self, path=HISTORY_DB_FILE):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS positions ("
+            "nm_id INTEGER NOT NULL, keyword TEXT NOT NULL, ts INTEGER NOT NULL, "
+            "position INTEGER, total INTEGER, "
+            "PRIMARY KEY (nm_id, keyword, ts)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prices ("
+            "nm_id INTEGER NOT NULL, ts INTEGER NOT NULL, old_price REAL, new_price REAL, "
+            "PRIMARY KEY (nm_id, ts)) WITHOUT ROWID"
+        )
+        self._lock = threading.Lock()
+
+    def _record_positions(self, rows, ts=None):
+        """Сохраняет результаты поиска: rows - [(nm_id, keyword, position или None, total)]."""
+        ts = int(time.time()) if ts is None else int(ts)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO positions (nm_id, keyword, ts, position, total) VALUES (?, ?, ?, ?, ?)",
+                [(nm_id, normalize_query(keyword), ts, position, total) for nm_id, keyword, position, total in rows]
+            )
+
+    def _record_prices(self, rows, ts=None):
+        """Сохраняет цены: rows - [(nm_id, old_price, new_price)]."""
+        ts = int(time.time()) if ts is None else int(ts)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO prices (nm_id, ts, old_price, new_price) VALUES (?, ?, ?, ?)",
+                [(nm_id, ts, old_price, new_price) for nm_id, old_price, new_price in rows]
+            )
+
+    def _positions(self, nm_id, keyword, since=None, limit=100):
+        """Точки истории позиций (ts, position, total), от новых к старым."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT ts, position, total FROM positions WHERE nm_id = ? AND keyword = ? AND ts >= ? "
+                "ORDER BY ts DESC LIMIT ?",
+                (nm_id, normalize_query(keyword), since or 0, limit)
+            ).fetchall()
+
+    def _keywords(self, nm_id):
+        """Ключевые слова, по которым для товара есть история."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT keyword FROM positions WHERE nm_id = ?", (nm_id,)
+            )]
+
+    def _latest_positions(self, nm_id):
+        """Последние две точки по каждому ключевому слову: {keyword: [(ts, position, total), ...]}.
+
+        Достаточно для ответа "позиция и изменение с прошлой проверки" без обхода выдачи.
+        """
+        return {keyword: self._positions(nm_id, keyword, limit=2) for keyword in self._keywords(nm_id)}
+
+    def _latest_prices(self, nm_id, limit=2):
+        """Последние цены товара (ts, old_price, new_price), от новых к старым."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT ts, old_price, new_price FROM prices WHERE nm_id = ? ORDER BY ts DESC LIMIT ?",
+                (nm_id, limit)
+            ).fetchall()
+
+    def _purge_older_than(self, ts):
+        """Удаляет точки старше ts."""
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM positions WHERE ts < ?", (ts,)).rowcount
+            deleted += self._conn.execute("DELETE FROM prices WHERE ts < ?", (ts,)).rowcount
+        if deleted:
+            logger.info("Purged %s history points older than %s from %s", deleted, ts, self.path)
+        return deleted
+
+    async def record_positions(self, rows, ts=None):
+        """Сохраняет результаты поиска: rows - [(nm_id, keyword, position или None, total)]."""
+        await asyncio.to_thread(self._record_positions, rows, ts)
+
+    async def record_prices(self, rows, ts=None):
+        """Сохраняет цены: rows - [(nm_id, old_price, new_price)]."""
+        await asyncio.to_thread(self._record_prices, rows, ts)
+
+    async def positions(self, nm_id, keyword, since=None, limit=100):
+        """Точки истории позиций (ts, position, total), от новых к старым."""
+        return await asyncio.to_thread(self._positions, nm_id, keyword, since, limit)
+
+    async def keywords(self, nm_id):
+        """Ключевые слова, по которым для товара есть история."""
+        return await asyncio.to_thread(self._keywords, nm_id)
+
+    async def latest_positions(self, nm_id):
+        """Последние две точки по каждому ключевому слову: {keyword: [(ts, position, total), ...]}."""
+        return await asyncio.to_thread(self._latest_positions, nm_id)
+
+    async def latest_prices(self, nm_id, limit=2):
+        """Последние цены товара (ts, old_price, new_price), от новых к старым."""
+        return await asyncio.to_thread(self._latest_prices, nm_id, limit)
+
+    async def purge_older_than(self, ts):
+        """Удаляет точки старше ts; возвращает их число."""
+        return await asyncio.to_thread(self._purge_older_than, ts)
+
+_history_store = None
+
+def get_history_store():
+    """Возвращает общее хранилище истории (создается лениво)."""
+    global _history_store
+    if _history_store is None:
+        _history_store = HistoryStore()
+    return _history_store
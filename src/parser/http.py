@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import aiohttp
+from .config import (
+    HTTP_HEADERS, HTTP_TIMEOUT, HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST, HTTP_KEEPALIVE_TIMEOUT, HTTP_RETRIES
+)
+from .ratelimit import get_limiter, parse_retry_after, host_key
+from .metrics import HTTP_SECONDS, HTTP_REQUESTS, HTTP_IN_FLIGHT, Timer
+from .decode import loads
+from .logs import SAMPLED
+
+logger = logging.getLogger(__name__)
+
+# Исключения, которые означают неудачный HTTP-запрос
+HTTP_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+_session = None
+
+def get_session():
+    """Возвращает общую HTTP-сессию с пулом keep-alive соединений (создается лениво)."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            headers=HTTP_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+        )
+        logger.info("Created HTTP session: limit=%s, limit_per_host=%s", HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST)
+    return _session
+
+async def close_session():
+    """Закрывает общую HTTP-сессию и все соединения пула."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("HTTP session closed")
+    _session = None
+
+def _is_throttled(status):
+    return status == 429 or status >= 500
+
+async def fetch_json(url, timeout=None, retries=HTTP_RETRIES, parse=loads):
+    """Выполняет GET-запрос и возвращает тело ответа, разобранное функцией parse.
+
+    По умолчанию parse полностью декодирует JSON; для больших ответов можно
+    передать функцию, оставляющую только нужные поля. Запрос проходит через
+    лимитер хоста; после 429/5xx лимитер снижает скорость, и запрос
+    повторяется до retries раз, а повышает ее только ответ 2xx. При ошибке сети, таймауте или статусе >= 400
+    бросает одно из HTTP_ERRORS, при некорректном JSON - ValueError.
+    """
+    session = get_session()
+    limiter = get_limiter(url)
+    # Явный timeout=None в session.get снял бы ограничение сессии, поэтому передаем его всегда
+    request_timeout = aiohttp.ClientTimeout(total=timeout or HTTP_TIMEOUT)
+    host = host_key(url)
+    for attempt in range(retries + 1):
+        await limiter.acquire()
+        status = "error"
+        timer = Timer()
+        HTTP_IN_FLIGHT.inc(host)
+        try:
+            async with session.get(url, timeout=request_timeout) as response:
+                status = str(response.status)
+                if _is_throttled(response.status):
+                    limiter.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+                    if attempt < retries:
+                        logger.info("Got HTTP %s for %s, retrying (%s/%s)", response.status, url, attempt + 1, retries, extra=SAMPLED)
+                        continue
+                elif response.status < 300:
+                    # 404 от пробы корзины и другие 4xx не говорят о запасе скорости у хоста
+                    limiter.on_success()
+                response.raise_for_status()
+                return parse(await response.read())
+        except asyncio.TimeoutError:
+            status = "timeout"
+            limiter.on_throttle()
+            raise
+        except asyncio.CancelledError:
+            status = "cancelled"  # Например, лишние пробы корзин после первого ответа
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec(host)
+            HTTP_SECONDS.observe(timer.elapsed, host)
+            HTTP_REQUESTS.inc(host, status)
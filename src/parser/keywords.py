@@ -1,100 +1,77 @@
-import os
+import logging
 import time
-import shutil
 import re
-from .config import logger, STOP_WORDS
-import pymorphy2
+from .config import STOP_WORDS
+from .morph import lemmatize_many
+from .ai_model import get_model_service
+
+logger = logging.getLogger(__name__)
+
+# Фильтр для исключения цифр и символов
+VALID_PHRASE_RE = re.compile(r'^[а-яА-Яa-zA-Z\s]+$')
+
+# Ответы при ошибке ИИ-извлечения: показываются вместо ключевых слов, но карточка с ними не кэшируется
+KEYBERT_MISSING_KEYWORDS = ("ошибка", "keybert", "не", "установлен")
+KEYBERT_FAILED_KEYWORDS = ("ошибка", "ключевые", "слова", "не", "сгенерированы")
+
+def is_extraction_error(keywords):
+    """True, если вместо ключевых слов вернулось сообщение об ошибке извлечения."""
+    return tuple(keywords) in (KEYBERT_MISSING_KEYWORDS, KEYBERT_FAILED_KEYWORDS)
+
+def is_valid_phrase(phrase):
+    return bool(VALID_PHRASE_RE.match(phrase)) and len(phrase) > 2
 
 def extract_keywords_manual(data, title):
     """Ручное извлечение ключевых слов: сначала из названия, затем из options, затем из compositions."""
-    logger.info("Starting manual keyword extraction")
+    logger.debug("Starting manual keyword extraction")
     start_time = time.time()
-    morph = pymorphy2.MorphAnalyzer()
-    keywords = []  # Список для сохранения порядка
-    seen_keywords = set()  # Множество для исключения дубликатов
-
-    # Фильтр для исключения цифр и символов
-    def is_valid_phrase(phrase):
-        return bool(re.match(r'^[а-яА-Яa-zA-Z\s]+$', phrase)) and len(phrase) > 2
-
-    # Обработка слова или фразы
-    def process_phrase(phrase):
-        phrase = phrase.strip()
-        if not is_valid_phrase(phrase) or phrase.lower() in STOP_WORDS:
-            return None
-        # Если фраза содержит пробел (словосочетание), сохраняем как есть
-        if ' ' in phrase:
-            return phrase
-        # Для одиночных слов применяем лемматизацию
-        return morph.parse(phrase)[0].normal_form
 
-    # 1. Извлекаем все слова из названия
-    title_words = title.split()
-    for word in title_words:
-        result = process_phrase(word)
-        if result and result not in seen_keywords:
-            keywords.append(result)
-            seen_keywords.add(result)
-    # Затем добавляем полное название как фразу, если оно содержит пробелы
+    # 1. Все слова из названия, затем полное название как фраза, если оно содержит пробелы
+    phrases = title.split()
     if ' ' in title.strip():
-        result = process_phrase(title)
-        if result and result not in seen_keywords:
-            keywords.append(result)
-            seen_keywords.add(result)
-    logger.info(f"Extracted {len(keywords)} keywords from title: {keywords}")
+        phrases.append(title)
 
-    # 2. Ключевые слова из options
+    # 2. Фразы из options
     for opt in data.get("options", []):
         if opt["name"] in ["Особенности продукта", "Назначение киселя", "Состав"]:
-            option_phrases = opt["value"].replace(";", ",").split(", ")
-            for phrase in option_phrases:
-                result = process_phrase(phrase)
-                if result and result not in seen_keywords:
-                    keywords.append(result)
-                    seen_keywords.add(result)
-    logger.info(f"Extracted {len(keywords)} keywords after options: {keywords}")
+            phrases.extend(opt["value"].replace(";", ",").split(", "))
+
+    # 3. Фразы из compositions
+    phrases.extend(comp["name"] for comp in data.get("compositions", []))
 
-    # 3. Ключевые слова из compositions
-    for comp in data.get("compositions", []):
-        phrase = comp["name"].strip()
-        result = process_phrase(phrase)
-        if result and result not in seen_keywords:
+    phrases = [phrase.strip() for phrase in phrases]
+    phrases = [phrase for phrase in phrases if is_valid_phrase(phrase) and phrase.lower() not in STOP_WORDS]
+
+    # Словосочетания сохраняем как есть, одиночные слова лемматизируем одним пакетом
+    single_words = [phrase for phrase in phrases if ' ' not in phrase]
+    lemmas = dict(zip(single_words, lemmatize_many(single_words)))
+
+    keywords = []  # Список для сохранения порядка
+    seen_keywords = set()  # Множество для исключения дубликатов
+    for phrase in phrases:
+        result = lemmas.get(phrase, phrase)
+        if result not in seen_keywords:
             keywords.append(result)
             seen_keywords.add(result)
-    logger.info(f"Extracted {len(keywords)} keywords after compositions: {keywords}")
 
     # Ограничиваем до 10 ключевых слов
     keywords = keywords[:10]
     elapsed_time = time.time() - start_time
-    logger.info(f"Manual keyword extraction completed in {elapsed_time:.2f}s, final keywords: {keywords}")
+    logger.debug("Manual keyword extraction completed in %.4fs, final keywords: %s", elapsed_time, keywords)
     return keywords
 
-def extract_keywords_ai(title, description):
-    """Извлечение 5 ключевых слов с использованием KeyBERT. Работает долго и не очень"""
-    logger.info("Starting AI keyword extraction")
+async def extract_keywords_ai_async(title, description):
+    """Извлечение ключевых слов KeyBERT через общую модель без блокировки цикла событий."""
+    logger.debug("Starting AI keyword extraction")
     start_time = time.time()
     try:
-        cache_dir = os.path.expanduser("~/.cache/huggingface")
-        if os.path.exists(cache_dir):
-            logger.info(f"Clearing Hugging Face cache at {cache_dir}")
-            shutil.rmtree(cache_dir)
-        from keybert import KeyBERT
-        kw_model = KeyBERT(model='sentence-transformers/all-MiniLM-L6-v2')
-        text = f"{title}. {description}"
-        keywords = kw_model.extract_keywords(
-            text,
-            keyphrase_ngram_range=(1, 2),
-            stop_words=STOP_WORDS,
-            top_n=5,
-            diversity=0.5
-        )
+        keywords = await get_model_service().extract_async(f"{title}. {description}")
         elapsed_time = time.time() - start_time
-        keywords = [kw[0] for kw in keywords]
-        logger.info(f"AI keyword extraction completed in {elapsed_time:.2f}s, keywords: {keywords}")
+        logger.debug("AI keyword extraction completed in %.2fs, keywords: %s", elapsed_time, keywords)
         return keywords
     except ImportError:
         logger.error("KeyBERT not installed, cannot use AI method")
-        return ["ошибка", "keybert", "не", "установлен"]
+        return list(KEYBERT_MISSING_KEYWORDS)
     except Exception as e:
-        logger.error(f"Error in KeyBERT: {str(e)}")
-        return ["ошибка", "ключевые", "слова", "не", "сгенерированы"]
\ No newline at end of file
+        logger.error("Error in KeyBERT: %s", e)
+        return list(KEYBERT_FAILED_KEYWORDS)
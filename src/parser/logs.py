@@ -0,0 +1,152 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+_listener = None
+_handlers = []
+_worker_queue = None
+_worker_listener = None
+
+def parse_levels(value):
+    """Разбирает строку "логгер=уровень,..." в словарь {логгер: уровень}."""
+    levels = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+# extra для сообщений из горячих циклов (страницы выдачи, пробы корзин, лимитер):
+# только они ограничиваются SamplingFilter, например logger.info("...", page, extra=SAMPLED)
+SAMPLED = {"sampled": True}
+
+class SamplingFilter(logging.Filter):
+    """Ограничивает частоту одинаковых сообщений уровня INFO и ниже, помеченных extra=SAMPLED.
+
+    Сообщения сравниваются по логгеру и шаблону (record.msg до подстановки
+    аргументов), поэтому "Requesting search page %s" с разными страницами -
+    одно и то же сообщение. За interval секунд проходит не больше burst
+    таких записей; остальные отбрасываются, а первая запись следующего
+    интервала сообщает, сколько было пропущено. Непомеченные сообщения
+    (разовые события вроде постановки задания в очередь), а также WARNING
+    и выше не отбрасываются.
+    """
+
+    def __init__(self, interval, burst):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._windows = {}  # (логгер, шаблон) -> [начало интервала, записей за интервал]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or self.burst <= 0 or not getattr(record, "sampled", False):
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[1] - self.burst if window is not None and window[1] > self.burst else 0
+                self._windows[key] = [now, 1]
+            else:
+                window[1] += 1
+                if window[1] > self.burst:
+                    return False
+                suppressed = 0
+        if suppressed and isinstance(record.args, tuple) and isinstance(record.msg, str):
+            record.msg = record.msg + " (%d similar messages suppressed)"
+            record.args = record.args + (suppressed,)
+        return True
+
+class _LocalQueueHandler(QueueHandler):
+    """QueueHandler для очереди внутри процесса.
+
+    Запись кладется в очередь как есть: форматирование строки и трассировки
+    выполняется в потоке QueueListener, а не в цикле событий.
+    """
+
+    def prepare(self, record):
+        return record
+
+def _apply_levels(level, levels):
+    logging.getLogger().setLevel(level)
+    for name, name_level in levels.items():
+        logging.getLogger(name).setLevel(name_level)
+
+def setup_logging(log_file, level="INFO", levels=None, sample_interval=10.0, sample_burst=20):
+    """Настраивает логирование процесса (повторные вызовы ничего не делают).
+
+    Логгеры пишут в очередь, а в консоль и в log_file (с ротацией) записи
+    выводит фоновый поток QueueListener, поэтому запись на диск не задерживает
+    обработку запросов. levels задает уровни отдельных логгеров, например
+    {"parser.search": "WARNING", "aiogram.event": "WARNING"}.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    formatter = logging.Formatter(LOG_FORMAT)
+    _handlers.append(logging.StreamHandler())
+    if log_file:
+        try:
+            os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+            _handlers.append(RotatingFileHandler(
+                log_file,
+                maxBytes=10*1024*1024,  # 10 МБ
+                backupCount=5  # Хранить до 5 резервных копий
+            ))
+        except OSError as e:
+            logging.getLogger(__name__).error("Failed to open log file %s: %s", log_file, e)
+    for handler in _handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LocalQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_interval, sample_burst))
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    _apply_levels(level, levels or {})
+
+    _listener = QueueListener(log_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Останавливает фоновые потоки, предварительно записав все сообщения из очередей."""
+    global _listener, _worker_listener
+    if _worker_listener is not None:
+        _worker_listener.stop()
+        _worker_listener = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        for handler in _handlers:
+            handler.close()
+        _handlers.clear()
+
+def get_worker_queue(mp_context):
+    """Очередь для логов дочерних процессов; записи из нее выводятся теми же обработчиками."""
+    global _worker_queue, _worker_listener
+    if _listener is None:
+        return None
+    if _worker_queue is None:
+        _worker_queue = mp_context.Queue()
+        _worker_listener = QueueListener(_worker_queue, *_handlers, respect_handler_level=True)
+        _worker_listener.start()
+    return _worker_queue
+
+def setup_worker_logging(log_queue, level="INFO", levels=None, sample_interval=10.0, sample_burst=20):
+    """Настраивает логирование в дочернем процессе: записи отправляются в родительский процесс."""
+    # При запуске через spawn модули импортируются до того, как процесс узнает о родителе,
+    # и могли настроить собственный вывод - он больше не нужен
+    stop_logging()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_interval, sample_burst))
+    logging.getLogger().handlers[:] = [queue_handler]
+    _apply_levels(level, levels or {})
@@ -0,0 +1,243 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Границы корзин гистограмм задержек, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PREFIX = "wbparser_"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Монотонно растущий счетчик. Значения меток передаются позиционно."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def total(self):
+        """Сумма по всем значениям меток."""
+        return sum(self._values.values())
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+class Gauge(Counter):
+    """Значение, которое может расти и уменьшаться (например, число запросов в работе)."""
+
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+class Histogram:
+    """Гистограмма задержек с фиксированными корзинами."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [счетчики корзин (+Inf последней), сумма, количество]
+
+    def observe(self, value, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def count(self, *labels):
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def quantile(self, q, *labels):
+        """Оценка квантиля по корзинам (верхняя граница корзины), None если наблюдений нет."""
+        entry = self._values.get(labels)
+        if not entry or not entry[2]:
+            return None
+        rank = q * entry[2]
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), entry[0]):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        for labels, (counts, total, count) in list(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket", _format_labels(self.labelnames, labels, ("le", _format_value(bound))), cumulative
+            yield self.name + "_sum", _format_labels(self.labelnames, labels), total
+            yield self.name + "_count", _format_labels(self.labelnames, labels), count
+
+class Registry:
+    """Набор метрик и функций, собирающих значения в момент выгрузки.
+
+    Запись значений - несколько операций со словарем без блокировок:
+    метрики обновляются из потока цикла событий, поэтому их можно держать
+    включенными постоянно. Состояние очередей и кэшей не пишется на каждом
+    запросе, а снимается функциями-сборщиками только при выгрузке.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def register_collector(self, key, collect):
+        """Регистрирует collect() -> [(имя, тип, описание, [(метки dict, значение)])] под ключом key."""
+        self._collectors[key] = collect
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples())
+        families = {}
+        for collect in list(self._collectors.values()):
+            for name, kind, help, samples in collect():
+                family = families.setdefault(PREFIX + name, (kind, help, []))
+                family[2].extend(samples)
+        for name, (kind, help, samples) in families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_names = tuple(labels)
+                lines.append(f"{name}{_format_labels(label_names, tuple(labels[n] for n in label_names))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("stage_duration_seconds", "Duration of pipeline stages", ("stage",))
+STAGE_ERRORS = registry.counter("stage_errors_total", "Pipeline stages that ended with an exception", ("stage",))
+STAGE_IN_FLIGHT = registry.gauge("stage_in_flight", "Pipeline stages currently running", ("stage",))
+HTTP_SECONDS = registry.histogram("http_request_duration_seconds", "Upstream HTTP request duration", ("host",))
+HTTP_REQUESTS = registry.counter("http_requests_total", "Upstream HTTP requests by status", ("host", "status"))
+HTTP_IN_FLIGHT = registry.gauge("http_in_flight", "Upstream HTTP requests in progress", ("host",))
+
+class Timer:
+    """Время выполнения блока; elapsed доступен и внутри блока, и после него."""
+
+    __slots__ = ("start", "end")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def elapsed(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+@contextmanager
+def track(stage):
+    """Замеряет этап (basket, price, keywords, search_page, telegram_edit, ...).
+
+    Обновляет гистограмму длительности, число этапов в работе и счетчик
+    ошибок; возвращает Timer, чтобы время можно было вывести в лог.
+    """
+    timer = Timer()
+    STAGE_IN_FLIGHT.inc(stage)
+    try:
+        yield timer
+    except Exception:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        timer.end = time.perf_counter()
+        STAGE_IN_FLIGHT.dec(stage)
+        STAGE_SECONDS.observe(timer.end - timer.start, stage)
+
+def register_cache(name, stats):
+    """Регистрирует кэш: stats() -> словарь с hits, misses и, если есть, entries и bytes."""
+    def collect():
+        values = stats()
+        hits, misses = values.get("hits", 0), values.get("misses", 0)
+        labels = {"cache": name}
+        families = [
+            ("cache_hits_total", "counter", "Cache hits", [(labels, hits)]),
+            ("cache_misses_total", "counter", "Cache misses", [(labels, misses)]),
+            ("cache_hit_ratio", "gauge", "Cache hit ratio since start", [(labels, hits / (hits + misses) if hits + misses else 0.0)]),
+        ]
+        # lru_cache сообщает число записей как size
+        entries = values.get("entries", values.get("size"))
+        if entries is not None:
+            families.append(("cache_entries", "gauge", "Cache entries", [(labels, entries)]))
+        if "bytes" in values:
+            families.append(("cache_bytes", "gauge", "Approximate cache size in bytes", [(labels, values["bytes"])]))
+        return families
+    registry.register_collector(("cache", name), collect)
+
+def register_stats(subsystem, stats):
+    """Экспортирует числовые значения stats() как gauge-метрики wbparser_<subsystem>_<ключ>."""
+    def collect():
+        return [
+            (f"{subsystem}_{key}", "gauge", f"{subsystem} {key}", [({}, value)])
+            for key, value in stats().items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+    registry.register_collector(("stats", subsystem), collect)
+
+async def handle_metrics(request):
+    """aiohttp-обработчик, отдающий метрики в текстовом формате Prometheus."""
+    from aiohttp import web
+    return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+async def start_metrics_server(host, port):
+    """Запускает отдельный HTTP-сервер с /metrics и возвращает его AppRunner."""
+    from aiohttp import web
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+from functools import lru_cache
+from .config import LEMMA_CACHE_SIZE
+from .metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+_morph = None
+_morph_lock = threading.Lock()
+
+def get_morph():
+    """Возвращает общий для процесса MorphAnalyzer (словари загружаются один раз)."""
+    global _morph
+    if _morph is None:
+        with _morph_lock:
+            if _morph is None:
+                start_time = time.time()
+                import pymorphy2
+                _morph = pymorphy2.MorphAnalyzer()
+                elapsed_time = time.time() - start_time
+                logger.info("pymorphy2 MorphAnalyzer loaded in %.2fs", elapsed_time)
+    return _morph
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _lemmatize_lower(word):
+    return get_morph().parse(word)[0].normal_form
+
+def lemmatize_many(words):
+    """Лемматизирует список слов за один вызов; повторы внутри списка разбираются один раз."""
+    lemmas = {}
+    for word in words:
+        key = word.lower()
+        if key not in lemmas:
+            lemmas[key] = _lemmatize_lower(key)
+    return [lemmas[word.lower()] for word in words]
+
+def lemma_cache_stats():
+    """Статистика кэша лемм: попадания, промахи, текущий и максимальный размер."""
+    info = _lemmatize_lower.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+register_cache("lemma", lemma_cache_stats)
+
+def clear_lemma_cache():
+    """Очищает кэш лемм (для замеров на холодном кэше)."""
+    _lemmatize_lower.cache_clear()
+
+def warm_up():
+    """Загружает словари заранее, чтобы первый запрос не ждал их загрузки."""
+    get_morph()
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import struct
+import time
+from array import array
+from collections import namedtuple
+from .config import SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_BYTES, STATE_LOCK_TTL, STATE_POLL_INTERVAL
+from .cache import TTLCache
+from .decode import loads
+from .metrics import register_stats
+from .logs import SAMPLED
+from .state import get_state_backend, STATE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Страница выдачи в компактном виде: total из ответа и упорядоченные ID товаров
+SearchPage = namedtuple("SearchPage", ["total", "ids"])
+
+# Результат поиска товара по запросу: position и page - None, если товар не найден;
+# truncated_at - сколько страниц просмотрено, если обход остановлен лимитом раньше конца выдачи
+SearchResult = namedtuple("SearchResult", ["position", "page", "total", "truncated_at"], defaults=[None])
+
+def normalize_query(query):
+    """Нормализует поисковый запрос для ключа кэша: регистр и лишние пробелы."""
+    return " ".join(query.lower().split())
+
+def compact_page(data):
+    """Преобразует ответ поиска в SearchPage, отбрасывая все поля товаров, кроме ID."""
+    payload = data.get("data", {})
+    ids = array("Q", (product["id"] for product in payload.get("products", []) if product.get("id")))
+    return SearchPage(payload.get("total", 0), ids)
+
+def parse_search_page(raw):
+    """Декодирует ответ поиска сразу в SearchPage; словари товаров сразу освобождаются."""
+    return compact_page(loads(raw))
+
+def _page_size(page):
+    return 64 + page.ids.itemsize * len(page.ids)
+
+def encode_page(page):
+    """SearchPage в байты для общего хранилища: total и ID товаров по 8 байт."""
+    return struct.pack("<Q", page.total) + page.ids.tobytes()
+
+def decode_page(data):
+    ids = array("Q")
+    ids.frombytes(data[8:])
+    return SearchPage(struct.unpack_from("<Q", data)[0], ids)
+
+class SearchPageCache:
+    """Общий для всех пользователей кэш страниц выдачи с объединением одинаковых запросов.
+
+    Ключ - (нормализованный запрос, номер страницы). Если страница уже
+    загружается, повторный запрос ждет тот же HTTP-запрос; загрузка
+    отменяется, только когда от нее отказались все ожидающие.
+
+    При общем хранилище состояния (несколько реплик) страницы кладутся и в
+    него, а загрузку одной страницы разными репликами объединяет блокировка:
+    реплика, не получившая ее, ждет результат из хранилища.
+    """
+
+    def __init__(self, ttl=SEARCH_CACHE_TTL, max_bytes=SEARCH_CACHE_MAX_BYTES):
+        self._cache = TTLCache("search_page", ttl, max_bytes=max_bytes, size_of=_page_size)
+        self._inflight = {}  # key -> [task, число ожидающих]
+        self.coalesced = 0
+        self.shared_hits = 0
+        self.shared_waits = 0
+        register_stats("search_page_requests", lambda: {
+            "coalesced": self.coalesced, "inflight": len(self._inflight),
+            "shared_hits": self.shared_hits, "shared_waits": self.shared_waits
+        })
+
+    async def get(self, query, page, loader):
+        """Возвращает SearchPage; при промахе вызывает loader(query, page) -> SearchPage."""
+        query = normalize_query(query)
+        key = f"{query}\x00{page}"
+        cached = await self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = [asyncio.ensure_future(self._load(key, query, page, loader)), 0]
+            self._inflight[key] = entry
+        else:
+            self.coalesced += 1
+            logger.info("Coalesced search page request query='%s', page=%s", query, page, extra=SAMPLED)
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                entry[0].cancel()
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+
+    async def _load(self, key, query, page, loader):
+        try:
+            backend = get_state_backend()
+            if backend.shared:
+                result = await self._load_shared(backend, key, query, page, loader)
+            else:
+                result = await loader(query, page)
+            await self._cache.set(key, result)
+            return result
+        finally:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[0] is asyncio.current_task():
+                del self._inflight[key]
+
+    async def _load_shared(self, backend, key, query, page, loader):
+        """Загрузка через общее хранилище: страницу загружает одна реплика, остальные берут ее результат."""
+        shared_key = f"page:{key}"
+        lock_name = f"page:{key}"
+        token = None
+        try:
+            deadline = time.monotonic() + STATE_LOCK_TTL
+            while True:
+                data = await backend.get(shared_key)
+                if data is not None:
+                    self.shared_hits += 1
+                    return decode_page(data)
+                token = await backend.acquire_lock(lock_name, STATE_LOCK_TTL)
+                if token is not None or time.monotonic() >= deadline:
+                    break
+                # Страницу загружает другая реплика; если она не справится, блокировка освободится или истечет
+                self.shared_waits += 1
+                await asyncio.sleep(STATE_POLL_INTERVAL)
+        except STATE_ERRORS as e:
+            logger.error("State backend unavailable, loading search page query='%s', page=%s directly: %s", query, page, e)
+            return await loader(query, page)
+
+        try:
+            result = await loader(query, page)
+            try:
+                await backend.set(shared_key, encode_page(result), self._cache.ttl)
+            except STATE_ERRORS as e:
+                logger.error("Failed to share search page query='%s', page=%s: %s", query, page, e)
+            return result
+        finally:
+            if token is not None:
+                try:
+                    await backend.release_lock(lock_name, token)
+                except STATE_ERRORS as e:
+                    logger.error("Failed to release lock for search page query='%s', page=%s: %s", query, page, e)
+
+    def stats(self):
+        """Статистика кэша страниц и число объединенных запросов."""
+        return dict(
+            self._cache.stats(), coalesced=self.coalesced, inflight=len(self._inflight),
+            shared_hits=self.shared_hits, shared_waits=self.shared_waits
+        )
+
+_page_cache = None
+
+def get_page_cache():
+    """Возвращает общий экземпляр SearchPageCache (создается лениво)."""
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = SearchPageCache()
+    return _page_cache
@@ -1,59 +1,106 @@
+import logging
 import os
-import time
-from .config import logger
+from .config import CARD_CACHE_TTL, PRICE_CACHE_TTL
 from .utils import extract_product_id
 from .api import get_basket, get_prices
-from .keywords import extract_keywords_manual, extract_keywords_ai
+from .basket import product_url
+from .cache import TTLCache, get_store
+from .keywords import extract_keywords_ai_async, is_extraction_error
+from .executor import extract_keywords_manual_async
+from .metrics import track
 
-def get_product_info(url):
-    """Получает информацию о товаре из JSON Wildberries."""
-    logger.info(f"Processing product URL: {url}")
-    nm_id = extract_product_id(url)
-    if not nm_id:
-        logger.error("Invalid URL format")
-        return {'error': 'Неверный формат ссылки'}
+logger = logging.getLogger(__name__)
 
+_card_cache = None
+_price_cache = None
+
+def get_card_cache():
+    """Кэш разобранных карточек: nm_id -> поля товара, корзина и ключевые слова."""
+    global _card_cache
+    if _card_cache is None:
+        # Ключевые слова зависят от метода извлечения, поэтому кэши методов разделены
+        use_ai = os.getenv("USE_AI", "false").lower() == "true"
+        _card_cache = TTLCache(f"card:{'ai' if use_ai else 'manual'}", CARD_CACHE_TTL, store=get_store())
+    return _card_cache
+
+def get_price_cache():
+    """Кэш цен: nm_id -> [old_price, new_price]."""
+    global _price_cache
+    if _price_cache is None:
+        _price_cache = TTLCache("price", PRICE_CACHE_TTL, store=get_store())
+    return _price_cache
+
+async def load_card(nm_id):
+    """Загружает и разбирает карточку товара, извлекает ключевые слова."""
     vol = nm_id // 100000
     part = nm_id // 1000
-    logger.info(f"Calculated vol={vol}, part={part}")
+    logger.info("Calculated vol=%s, part=%s", vol, part)
 
-    basket, data = get_basket(nm_id, vol, part)
+    basket, data = await get_basket(nm_id, vol, part)
     if not basket or not data:
-        logger.error(f"Failed to find basket for nm_id={nm_id}")
-        return {'error': f'Не удалось найти подходящую корзину для nm_id={nm_id}'}
+        logger.error("Failed to find basket for nm_id=%s", nm_id)
+        return None
 
-    logger.info(f"Found basket: {basket}")
+    logger.info("Found basket: %s", basket)
     title = data.get("imt_name", "Название не найдено")
-    brand = data.get("selling", {}).get("brand_name", "Бренд не найден")
-    article = data.get("nm_id", "Артикул не найден")
     description = data.get("description", "Описание не найдено")
-    photos = [f"https://{basket}.wbbasket.ru/vol{vol}/part{part}/{nm_id}/images/big/{i}.webp"
-              for i in range(1, data.get("media", {}).get("photo_count", 1) + 1)]
-    composition = next((opt["value"] for opt in data.get("options", []) if opt["name"] == "Состав"), "Не указан")
-    country = next((opt["value"] for opt in data.get("options", []) if opt["name"] == "Страна производства"), "Не указана")
-
-    # Получение цен
-    old_price, new_price = get_prices(nm_id)
-    logger.info(f"Retrieved prices for nm_id={nm_id}: old_price={old_price}, new_price={new_price}")
 
     use_ai = os.getenv("USE_AI", "false").lower() == "true"
-    logger.info(f"Using {'AI (KeyBERT)' if use_ai else 'manual'} method for keyword extraction")
-    start_time = time.time()
-    keywords = extract_keywords_ai(title, description) if use_ai else extract_keywords_manual(data, title)
-    elapsed_time = time.time() - start_time
-    logger.info(f"Keyword extraction completed in {elapsed_time:.2f}s")
+    logger.info("Using %s method for keyword extraction", 'AI (KeyBERT)' if use_ai else 'manual')
+    with track("keywords") as timer:
+        if use_ai:
+            keywords = await extract_keywords_ai_async(title, description)
+        else:
+            keywords = await extract_keywords_manual_async(data, title)
+    logger.info("Keyword extraction completed in %.2fs", timer.elapsed)
 
-    result = {
+    return {
+        "basket": basket,
         "title": title,
-        "brand": brand,
-        "article": article,
+        "brand": data.get("selling", {}).get("brand_name", "Бренд не найден"),
+        "article": data.get("nm_id", "Артикул не найден"),
         "description": description,
-        "photos": photos,
-        "composition": composition,
-        "country": country,
-        "keywords": keywords,
-        "old_price": old_price,
-        "new_price": new_price
+        "photos": [f"{product_url(basket, vol, part, nm_id)}/images/big/{i}.webp"
+                   for i in range(1, data.get("media", {}).get("photo_count", 1) + 1)],
+        "composition": next((opt["value"] for opt in data.get("options", []) if opt["name"] == "Состав"), "Не указан"),
+        "country": next((opt["value"] for opt in data.get("options", []) if opt["name"] == "Страна производства"), "Не указана"),
+        "keywords": keywords
     }
-    logger.info(f"Product info retrieved: title={title}, basket={basket}, old_price={old_price}, new_price={new_price}")
-    return result
\ No newline at end of file
+
+async def get_product_info(url):
+    """Получает информацию о товаре из JSON Wildberries."""
+    logger.info("Processing product URL: %s", url)
+    nm_id = extract_product_id(url)
+    if not nm_id:
+        logger.error("Invalid URL format")
+        return {'error': 'Неверный формат ссылки'}
+
+    card_cache = get_card_cache()
+    card = await card_cache.get(nm_id)
+    if card is None:
+        card = await load_card(nm_id)
+        if card is None:
+            return {'error': f'Не удалось найти подходящую корзину для nm_id={nm_id}'}
+        if is_extraction_error(card["keywords"]):
+            # Временная ошибка модели не должна закрепиться в кэше на CARD_CACHE_TTL
+            logger.warning("Keyword extraction failed for nm_id=%s, card is not cached", nm_id)
+        else:
+            await card_cache.set(nm_id, card)
+    else:
+        logger.info("Card cache hit for nm_id=%s", nm_id)
+
+    # Получение цен
+    price_cache = get_price_cache()
+    prices = await price_cache.get(nm_id)
+    if prices is None:
+        prices = await get_prices(nm_id)
+        if prices != (None, None):
+            await price_cache.set(nm_id, list(prices))
+    old_price, new_price = prices
+    logger.info("Retrieved prices for nm_id=%s: old_price=%s, new_price=%s", nm_id, old_price, new_price)
+
+    result = {key: value for key, value in card.items() if key != "basket"}
+    result["old_price"] = old_price
+    result["new_price"] = new_price
+    logger.info("Product info retrieved: title=%s, basket=%s, old_price=%s, new_price=%s", card['title'], card['basket'], old_price, new_price)
+    return result
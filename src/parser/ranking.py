@@ -0,0 +1,166 @@
+import logging
+import math
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from .config import MAX_SEARCH_PAGES, SEARCH_PAGE_SIZE, RANKING_SNAPSHOT_TTL, RANKING_MAX_BYTES
+from .pages import normalize_query, SearchResult
+from .metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+class RankingSnapshot:
+    """Снимок выдачи по запросу: упорядоченные ID товаров и индекс ID -> позиция в выдаче.
+
+    Страницы добавляются в любом порядке, но в снимок попадает только
+    непрерывный префикс выдачи, поэтому отсутствие ID среди первых pages
+    страниц означает, что товара на них нет. Индекс - отсортированный
+    массив ID и параллельный массив их смещений в выдаче (12 байт на товар
+    вместо ~100 у словаря), поиск по нему - bisect. Индекс строится при
+    первом поиске после добавления страниц.
+    """
+
+    __slots__ = (
+        "query", "total", "last_page", "ids", "pages", "complete", "created_at",
+        "_pending", "_sorted_ids", "_offsets"
+    )
+
+    def __init__(self, query, total, created_at=None):
+        self.query = query
+        self.total = total
+        self.last_page = min(MAX_SEARCH_PAGES, max(1, math.ceil(total / SEARCH_PAGE_SIZE)))
+        self.ids = array("Q")
+        self.pages = 0  # Сколько первых страниц уже в снимке
+        self.complete = False  # Просмотрены все страницы до last_page
+        self.created_at = time.time() if created_at is None else created_at
+        self._pending = {}  # Страницы, пришедшие раньше предыдущих
+        self._sorted_ids = array("Q")
+        self._offsets = array("I")  # _offsets[i] - смещение _sorted_ids[i] в ids
+
+    def add_page(self, page, ids):
+        """Добавляет страницу выдачи (последовательность ID товаров)."""
+        if self.complete or page <= self.pages or page in self._pending:
+            return
+        self._pending[page] = ids
+        while self.pages + 1 in self._pending:
+            page_ids = self._pending.pop(self.pages + 1)
+            self.pages += 1
+            if not page_ids:
+                # Выдача закончилась раньше, чем обещал total
+                self.last_page = self.pages - 1
+                break
+            self.ids.extend(page_ids)
+        if self.pages >= self.last_page:
+            self.complete = True
+            self._pending.clear()
+
+    def lookup(self, nm_id):
+        """Возвращает (позиция, страница) товара или None, если его нет в снимке."""
+        if len(self._sorted_ids) != len(self.ids):
+            self._build_index()
+        idx = bisect_left(self._sorted_ids, nm_id)
+        if idx == len(self._sorted_ids) or self._sorted_ids[idx] != nm_id:
+            return None
+        position = self._offsets[idx] + 1
+        return position, (position - 1) // SEARCH_PAGE_SIZE + 1
+
+    def _build_index(self):
+        # Сортировка устойчива: для повторяющегося ID первым идет его первое вхождение
+        order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+        self._sorted_ids = array("Q", (self.ids[offset] for offset in order))
+        self._offsets = array("I", order)
+
+    def size(self):
+        """Приблизительный объем снимка в байтах с индексом и страницами, ждущими предыдущих."""
+        pending = sum(len(ids) for ids in self._pending.values())
+        index_item = self._sorted_ids.itemsize + self._offsets.itemsize
+        return 256 + self.ids.itemsize * (len(self.ids) + pending) + index_item * len(self.ids)
+
+    def is_fresh(self, ttl=RANKING_SNAPSHOT_TTL):
+        return time.time() - self.created_at < ttl
+
+class RankingStore:
+    """Хранилище снимков выдачи по нормализованному запросу.
+
+    Давно не использованные снимки вытесняются при превышении max_bytes
+    (приблизительный объем, как у TTLCache). Снимки растут по мере
+    просмотра страниц, поэтому объем пересчитывается при каждом добавлении.
+    """
+
+    def __init__(self, ttl=RANKING_SNAPSHOT_TTL, max_bytes=RANKING_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._snapshots = OrderedDict()  # query -> (snapshot, учтенный объем)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        """Возвращает свежий снимок по запросу или None."""
+        key = normalize_query(query)
+        entry = self._snapshots.get(key)
+        if entry is None or not entry[0].is_fresh(self.ttl):
+            return None
+        self._snapshots.move_to_end(key)
+        return entry[0]
+
+    def lookup(self, query, nm_id):
+        """Ищет позицию товара без обращения к сети.
+
+        Возвращает SearchResult (position и page - None, если снимок полный и
+        товара в нем нет) или None, если ответа по снимку дать нельзя.
+        """
+        snapshot = self.get(query)
+        if snapshot is not None:
+            found = snapshot.lookup(nm_id)
+            if found is not None:
+                self.hits += 1
+                return SearchResult(found[0], found[1], snapshot.total)
+            if snapshot.complete:
+                self.hits += 1
+                return SearchResult(None, None, snapshot.total)
+        self.misses += 1
+        return None
+
+    def record_page(self, query, page, search_page):
+        """Добавляет загруженную страницу (SearchPage) в снимок запроса."""
+        key = normalize_query(query)
+        entry = self._snapshots.get(key)
+        if entry is None or not entry[0].is_fresh(self.ttl):
+            if page != 1:
+                return None  # Новый снимок начинается только с первой страницы (нужен total)
+            self._remove(key)
+            snapshot = RankingSnapshot(key, search_page.total)
+        else:
+            snapshot = self._remove(key)
+        was_complete = snapshot.complete
+        snapshot.add_page(page, search_page.ids)
+        size = snapshot.size()
+        self._snapshots[key] = (snapshot, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._snapshots) > 1:
+            self._remove(next(iter(self._snapshots)))
+        if snapshot.complete and not was_complete:
+            logger.info("Ranking snapshot for query='%s' completed: %s products on %s pages", key, len(snapshot.ids), snapshot.pages)
+        return snapshot
+
+    def _remove(self, key):
+        entry = self._snapshots.pop(key, None)
+        if entry is None:
+            return None
+        self._bytes -= entry[1]
+        return entry[0]
+
+    def stats(self):
+        return {"snapshots": len(self._snapshots), "hits": self.hits, "misses": self.misses, "bytes": self._bytes}
+
+_ranking_store = None
+
+def get_ranking_store():
+    """Возвращает общий экземпляр RankingStore (создается лениво)."""
+    global _ranking_store
+    if _ranking_store is None:
+        _ranking_store = RankingStore()
+        register_cache("ranking", _ranking_store.stats)
+    return _ranking_store
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from .config import RATE_LIMITS, RATE_LIMIT_DEFAULT, RATE_LIMIT_MIN, RATE_LIMIT_MAX
+from .metrics import registry
+from .logs import SAMPLED
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveRateLimiter:
+    """Асинхронный token bucket с адаптивной скоростью.
+
+    Скорость растет на increase_step запросов в секунду после каждого
+    успешного ответа и уменьшается в backoff_factor раз при 429/5xx.
+    Retry-After приостанавливает выдачу токенов на указанное время.
+    """
+
+    def __init__(self, name, rate, min_rate=RATE_LIMIT_MIN, max_rate=RATE_LIMIT_MAX, increase_step=0.1, backoff_factor=0.5):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.increase_step = increase_step
+        self.backoff_factor = backoff_factor
+        self.waiting = 0
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()  # Очередь ожидающих обслуживается по порядку
+
+    def _refill(self, now):
+        capacity = max(1.0, self.rate)
+        self._tokens = min(capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Ждет, пока можно отправить следующий запрос."""
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now < self._blocked_until:
+                        await asyncio.sleep(self._blocked_until - now)
+                        continue
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+
+    def on_success(self):
+        """Успешный ответ: плавно увеличивает скорость."""
+        self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, retry_after=None):
+        """Ответ 429/5xx или таймаут: снижает скорость и учитывает Retry-After."""
+        self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+        self._tokens = 0.0
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+        logger.info("Rate limiter %s backed off to %.2f req/s, retry_after=%s", self.name, self.rate, retry_after, extra=SAMPLED)
+
+    def stats(self):
+        """Текущая скорость, доступные токены и число ожидающих запросов."""
+        return {"rate": round(self.rate, 3), "tokens": round(self._tokens, 3), "waiting": self.waiting}
+
+def parse_retry_after(value):
+    """Retry-After в секундах (число или HTTP-дата) или None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def host_key(url):
+    """Группа хостов для лимита: поддомены basket-NN объединяются в wbbasket.ru."""
+    host = urlsplit(url).hostname or ""
+    for key in RATE_LIMITS:
+        if host == key or host.endswith(f".{key}"):
+            return key
+    return host
+
+_limiters = {}
+
+def get_limiter(url):
+    """Возвращает общий лимитер для хоста URL (создается лениво)."""
+    key = host_key(url)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = AdaptiveRateLimiter(key, RATE_LIMITS.get(key, RATE_LIMIT_DEFAULT))
+        _limiters[key] = limiter
+    return limiter
+
+def limiter_stats():
+    """Состояние всех лимитеров: хост -> скорость и глубина очереди."""
+    return {key: limiter.stats() for key, limiter in _limiters.items()}
+
+def reset_limiters():
+    """Сбрасывает накопленное состояние лимитеров (скорость после снижений, Retry-After)."""
+    _limiters.clear()
+
+def _collect_limiters():
+    stats = limiter_stats()
+    return [
+        ("rate_limit_rps", "gauge", "Current adaptive request rate per host", [({"host": key}, value["rate"]) for key, value in stats.items()]),
+        ("rate_limit_waiting", "gauge", "Requests waiting for a rate limit token", [({"host": key}, value["waiting"]) for key, value in stats.items()]),
+    ]
+
+registry.register_collector("rate_limits", _collect_limiters)
@@ -1,68 +1,313 @@
-import requests
-from urllib.parse import quote
-from .config import logger, SEARCH_BASE_URL, SEARCH_HEADERS, MAX_SEARCH_PAGES
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from bot.messages import format_intermediate_results
 import asyncio
+import inspect
+import logging
+import math
+from collections import namedtuple
+from urllib.parse import quote
+from .config import (
+    SEARCH_BASE_URL, MAX_SEARCH_PAGES, SEARCH_PAGE_SIZE,
+    SEARCH_WINDOW, SEARCH_CONCURRENCY, KEYWORD_PARALLELISM,
+    SEARCH_JOB_PAGE_BUDGET
+)
+from .http import fetch_json, HTTP_ERRORS
+from .pages import parse_search_page, get_page_cache, SearchResult
+from .ranking import get_ranking_store
+from .metrics import track, register_stats
+from .logs import SAMPLED
+
+logger = logging.getLogger(__name__)
+
+# Состояние поиска для отчета о прогрессе: page - все страницы до нее просмотрены
+SearchProgress = namedtuple("SearchProgress", ["nm_id", "keyword", "keyword_idx", "total_keywords", "total_products", "page"])
+
+# Итог планирования: results - {idx: результат} для слов, которые не обходятся,
+# scans - [(idx, keyword, max_pages)] в порядке обхода, duplicates - {idx дубля: (idx слова с той же первой страницей, total дубля)}
+SearchPlan = namedtuple("SearchPlan", ["results", "scans", "duplicates"])
+
+_planner_stats = {"jobs": 0, "probes": 0, "resolved_on_probe": 0, "duplicates": 0, "pages_planned": 0, "pages_cut": 0}
+register_stats("search_planner", lambda: _planner_stats)
+
+_search_semaphore = None
+
+def get_search_semaphore():
+    """Общий для всех поисков лимит одновременных запросов к выдаче."""
+    global _search_semaphore
+    if _search_semaphore is None:
+        _search_semaphore = asyncio.Semaphore(SEARCH_CONCURRENCY)
+    return _search_semaphore
+
+async def load_search_page(keyword, page):
+    """Загружает одну страницу поисковой выдачи из сети и возвращает SearchPage."""
+    url = f"{SEARCH_BASE_URL}&query={quote(keyword)}&page={page}"
+    async with get_search_semaphore():
+        logger.info("Requesting search page %s: %s", page, url, extra=SAMPLED)
+        with track("search_page"):
+            return await fetch_json(url, parse=parse_search_page)
+
+async def fetch_search_page(keyword, page):
+    """Возвращает страницу выдачи (SearchPage) из общего кэша или из сети."""
+    return await get_page_cache().get(keyword, page, load_search_page)
 
-async def search_product_by_keywords(nm_id, keyword, update_message=None, keyword_idx=1, total_keywords=1, previous_results=None, cancel_event=None, update_page_interval=5):
-    """Ищет товар по ключевому слову на страницах выдачи Wildberries."""
-    logger.info(f"Searching for nm_id={nm_id} with keyword='{keyword}'")
-    encoded_keyword = quote(keyword)
-    page = 1
+async def _report_progress(on_progress, progress):
+    try:
+        result = on_progress(progress)
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        logger.error("Progress callback failed for keyword='%s', page=%s: %s", progress.keyword, progress.page, e)
+
+async def search_product_by_keywords(nm_id, keyword, on_progress=None, keyword_idx=1, total_keywords=1, cancel_event=None, progress_interval=5, window=SEARCH_WINDOW, max_pages=MAX_SEARCH_PAGES):
+    """Ищет товар по ключевому слову на страницах выдачи Wildberries.
+
+    Страницы загружаются скользящим окном из window запросов. Последняя
+    страница определяется по data.total первой страницы, но не дальше
+    max_pages; при находке оставшиеся запросы отменяются. После первой и каждой progress_interval
+    страницы вызывается on_progress(SearchProgress) (функция или корутина).
+    Возвращает SearchResult или None при ошибке и отмене.
+    """
+    logger.info("Searching for nm_id=%s with keyword='%s'", nm_id, keyword)
     total_products = 0
 
-    cancel_button = InlineKeyboardButton(text="❌ Отменить поиск", callback_data=f"cancel_{nm_id}")
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[[cancel_button]])
+    if cancel_event and cancel_event.is_set():
+        logger.info("Search cancelled for nm_id=%s, keyword='%s' before request", nm_id, keyword)
+        return None
 
-    while page <= MAX_SEARCH_PAGES:
-        if cancel_event and cancel_event.is_set():
-            logger.info(f"Search cancelled for nm_id={nm_id}, keyword='{keyword}'")
-            return None
+    # Сначала пробуем ответить по снимку выдачи, собранному предыдущими поисками
+    ranking_store = get_ranking_store()
+    known = ranking_store.lookup(keyword, nm_id)
+    if known is not None:
+        logger.info("Answered nm_id=%s, keyword='%s' from ranking snapshot: %s", nm_id, keyword, known)
+        return known
 
-        url = f"{SEARCH_BASE_URL}&query={encoded_keyword}&page={page}"
-        logger.info(f"Requesting search page {page} for keyword='{keyword}': {url}")
-        try:
-            await asyncio.sleep(1)
-            if cancel_event and cancel_event.is_set():
-                logger.info(f"Search cancelled for nm_id={nm_id}, keyword='{keyword}' before request")
-                return None
+    pending = {}  # task -> номер страницы
+    cancel_task = asyncio.ensure_future(cancel_event.wait()) if cancel_event else None
+    last_page = 1  # Пока не получена первая страница, известна только она
+    result_pages = 1  # Страниц в выдаче без учета max_pages
+    next_page = 1
+    pages_done = 0
+    completed_pages = set()
+    scanned_up_to = 0  # Все страницы до этой включительно просмотрены
 
-            response = requests.get(url, headers=SEARCH_HEADERS, timeout=5)
-            response.raise_for_status()
-            data = response.json()
+    # Частичный снимок: его первые страницы уже проверены, продолжаем со следующей
+    snapshot = ranking_store.get(keyword)
+    if snapshot is not None:
+        total_products = snapshot.total
+        result_pages = snapshot.last_page
+        last_page = min(result_pages, max_pages)
+        scanned_up_to = snapshot.pages
+        next_page = snapshot.pages + 1
 
-            products = data.get("data", {}).get("products", [])
-            if page == 1:
-                total_products = data.get("data", {}).get("total", 0)
-            if not products:
-                logger.info(f"No products found on page {page} for keyword='{keyword}'")
+    try:
+        while True:
+            while next_page <= last_page and len(pending) < window:
+                pending[asyncio.ensure_future(fetch_search_page(keyword, next_page))] = next_page
+                next_page += 1
+            if not pending:
                 break
 
-            # Подсчет позиции
-            for idx, product in enumerate(products, start=(page-1)*100+1):
-                if product.get("id") == nm_id:
-                    logger.info(f"Found product nm_id={nm_id} on page {page}, position {idx}")
-                    return idx, page, total_products
-
-            # Обновляем сообщение только на страницах, кратных update_page_interval (у тг ограничение, блок, если слишком часто обновлять)
-            if update_message and (page % update_page_interval == 0 or page == 1):
-                message_text = format_intermediate_results(
-                    keyword, keyword_idx, total_keywords, total_products, page, previous_results
-                )
-                try:
-                    await update_message.edit_text(message_text, reply_markup=keyboard)
-                except Exception as e:
-                    logger.error(f"Failed to update message for keyword='{keyword}', page={page}: {str(e)}")
-
-            page += 1
-
-        except requests.RequestException as e:
-            logger.error(f"Search request failed for keyword='{keyword}', page={page}: {str(e)}")
-            return None
-        except (KeyError, ValueError) as e:
-            logger.error(f"Error parsing search response for keyword='{keyword}', page={page}: {str(e)}")
-            return None
-
-    logger.info(f"Product nm_id={nm_id} not found for keyword='{keyword}' after {MAX_SEARCH_PAGES} pages")
-    return None, None, total_products
\ No newline at end of file
+            wait_for = set(pending)
+            if cancel_task is not None:
+                wait_for.add(cancel_task)
+            done, _ = await asyncio.wait(wait_for, return_when=asyncio.FIRST_COMPLETED)
+            if cancel_task is not None and cancel_task in done:
+                logger.info("Search cancelled for nm_id=%s, keyword='%s'", nm_id, keyword)
+                return None
+
+            for task in sorted(done, key=lambda t: pending.get(t, 0)):
+                if task not in pending:
+                    continue  # Уже отменена после пустой страницы
+                page = pending.pop(task)
+                search_page = task.result()
+                ranking_store.record_page(keyword, page, search_page)
+                if page == 1:
+                    total_products = search_page.total
+                    result_pages = min(MAX_SEARCH_PAGES, max(1, math.ceil(total_products / SEARCH_PAGE_SIZE)))
+                    last_page = min(result_pages, max_pages)
+                    logger.info("Keyword='%s' has %s products, scanning up to page %s", keyword, total_products, last_page)
+                if not search_page.ids:
+                    logger.info("No products found on page %s for keyword='%s'", page, keyword, extra=SAMPLED)
+                    # Выдача закончилась раньше, чем обещал total: дальние страницы не нужны
+                    last_page = min(last_page, page - 1)
+                    result_pages = min(result_pages, page - 1)
+                    for other_task, other_page in list(pending.items()):
+                        if other_page > last_page:
+                            other_task.cancel()
+                            del pending[other_task]
+                    continue
+
+                # Подсчет позиции
+                if nm_id in search_page.ids:
+                    idx = (page - 1) * SEARCH_PAGE_SIZE + search_page.ids.index(nm_id) + 1
+                    logger.info("Found product nm_id=%s on page %s, position %s", nm_id, page, idx)
+                    return SearchResult(idx, page, total_products)
+
+                pages_done += 1
+                completed_pages.add(page)
+                while scanned_up_to + 1 in completed_pages:
+                    scanned_up_to += 1
+
+                # Сообщаем о прогрессе только каждые progress_interval страниц (у тг ограничение, блок, если слишком часто обновлять)
+                if on_progress and (pages_done % progress_interval == 0 or page == 1) and not (cancel_event and cancel_event.is_set()):
+                    await _report_progress(on_progress, SearchProgress(
+                        nm_id, keyword, keyword_idx, total_keywords, total_products, scanned_up_to
+                    ))
+
+    except HTTP_ERRORS as e:
+        logger.error("Search request failed for keyword='%s': %s", keyword, e)
+        return None
+    except (KeyError, ValueError, AttributeError) as e:
+        logger.error("Error parsing search response for keyword='%s': %s", keyword, e)
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        if cancel_task is not None:
+            cancel_task.cancel()
+
+    if scanned_up_to < result_pages:
+        logger.info("Product nm_id=%s not found for keyword='%s' in first %s of %s pages", nm_id, keyword, scanned_up_to, result_pages)
+        return SearchResult(None, None, total_products, scanned_up_to)
+    logger.info("Product nm_id=%s not found for keyword='%s' after %s pages", nm_id, keyword, scanned_up_to)
+    return SearchResult(None, None, total_products)
+
+def allocate_pages(needs, budget):
+    """Делит budget страниц между словами: needs - сколько страниц нужно каждому.
+
+    Слова с меньшей потребностью получают все нужные страницы, остаток
+    поровну делится между остальными (max-min справедливое распределение).
+    """
+    allocation = [0] * len(needs)
+    order = sorted(range(len(needs)), key=lambda i: needs[i])
+    for position, i in enumerate(order):
+        share = budget // (len(order) - position)
+        allocation[i] = min(needs[i], share)
+        budget -= allocation[i]
+    return allocation
+
+async def _probe(keyword):
+    """Первая страница выдачи по слову: из снимка, кэша или сети. None при ошибке."""
+    ranking_store = get_ranking_store()
+    snapshot = ranking_store.get(keyword)
+    if snapshot is not None:
+        return snapshot
+    try:
+        search_page = await fetch_search_page(keyword, 1)
+    except HTTP_ERRORS as e:
+        logger.error("Probe request failed for keyword='%s': %s", keyword, e)
+        return None
+    except (KeyError, ValueError, AttributeError) as e:
+        logger.error("Error parsing probe response for keyword='%s': %s", keyword, e)
+        return None
+    return ranking_store.record_page(keyword, 1, search_page)
+
+async def plan_search(nm_id, keywords, budget=SEARCH_JOB_PAGE_BUDGET):
+    """Планирует обход выдачи по нескольким ключевым словам одного товара.
+
+    Первые страницы всех слов загружаются одновременно. Слова, для которых
+    ответ уже известен (товар на первой странице, выдача пуста или снимок
+    полный), в обход не попадают. Слова, первая страница которых совпадает
+    с первой страницей другого слова вплоть до порядка товаров, получают
+    его результат. Остальные обходятся от узких запросов к широким, а
+    страницы делятся между ними в пределах budget на весь поиск (включая
+    первые страницы); слова, которым страниц не досталось, не обходятся.
+    """
+    _planner_stats["jobs"] += 1
+    _planner_stats["probes"] += len(keywords)
+    snapshots = await asyncio.gather(*(_probe(keyword) for keyword in keywords))
+
+    results = {}
+    candidates = []  # (idx, keyword, snapshot) - слова, которым нужен обход
+    for idx, (keyword, snapshot) in enumerate(zip(keywords, snapshots), 1):
+        if snapshot is None:
+            candidates.append((idx, keyword, None))
+            continue
+        found = snapshot.lookup(nm_id)
+        if found is not None:
+            results[idx] = SearchResult(found[0], found[1], snapshot.total)
+        elif snapshot.complete:
+            results[idx] = SearchResult(None, None, snapshot.total)
+        else:
+            candidates.append((idx, keyword, snapshot))
+    _planner_stats["resolved_on_probe"] += len(results)
+
+    duplicates = {}
+    unique = []
+    for idx, keyword, snapshot in candidates:
+        first_page = snapshot.ids[:SEARCH_PAGE_SIZE] if snapshot is not None else None
+        original = next((
+            other_idx for other_idx, _, other in unique
+            if other is not None and first_page is not None and first_page == other.ids[:SEARCH_PAGE_SIZE]
+        ), None)
+        if original is not None:
+            duplicates[idx] = (original, snapshot.total)
+            logger.info("Keyword='%s' duplicates keyword #%s by its first page, not scanning it", keyword, original)
+        else:
+            unique.append((idx, keyword, snapshot))
+    _planner_stats["duplicates"] += len(duplicates)
+
+    # Узкие запросы первыми: товар в них вероятнее найти, а обход дешевле; без первой страницы - в конце
+    unique.sort(key=lambda item: item[2].total if item[2] is not None else math.inf)
+    needs = [
+        snapshot.last_page - snapshot.pages if snapshot is not None else MAX_SEARCH_PAGES
+        for _, _, snapshot in unique
+    ]
+    if budget:
+        allocation = allocate_pages(needs, max(0, budget - len(keywords)))
+    else:
+        allocation = needs
+    _planner_stats["pages_planned"] += sum(allocation)
+    _planner_stats["pages_cut"] += sum(needs) - sum(allocation)
+
+    scans = []
+    for (idx, keyword, snapshot), need, pages in zip(unique, needs, allocation):
+        known_pages = snapshot.pages if snapshot is not None else 0
+        if pages < need:
+            logger.info("Keyword='%s' scan limited to %s of %s pages by the search budget", keyword, known_pages + pages, known_pages + need)
+        if pages > 0:
+            scans.append((idx, keyword, known_pages + pages))
+        elif snapshot is not None:
+            # Страниц не досталось: результат - по уже просмотренным первым страницам
+            results[idx] = SearchResult(None, None, snapshot.total, known_pages)
+        else:
+            results[idx] = None  # Первая страница не загрузилась, а на повтор страниц не осталось
+    return SearchPlan(results, scans, duplicates)
+
+async def search_keywords(nm_id, keywords, on_result=None, cancel_event=None, parallelism=KEYWORD_PARALLELISM, page_budget=SEARCH_JOB_PAGE_BUDGET, **kwargs):
+    """Ищет товар по нескольким ключевым словам, не более parallelism одновременно.
+
+    Сначала строится план (см. plan_search): слова, решенные по первой
+    странице, и дубли не обходятся, остальные обходятся в порядке плана в
+    пределах page_budget страниц. Возвращает результаты в порядке keywords;
+    on_result(idx, keyword, result) вызывается по мере готовности каждого слова.
+    """
+    semaphore = asyncio.Semaphore(parallelism)
+    results = [None] * len(keywords)
+    if cancel_event and cancel_event.is_set():
+        return results
+    plan = await plan_search(nm_id, keywords, budget=page_budget)
+    if cancel_event and cancel_event.is_set():
+        return results
+
+    def finish(idx, result):
+        results[idx - 1] = result
+        if on_result and not (cancel_event and cancel_event.is_set()):
+            on_result(idx, keywords[idx - 1], result)
+        for duplicate_idx, (original_idx, total_products) in plan.duplicates.items():
+            if original_idx == idx:
+                finish(duplicate_idx, result._replace(total=total_products) if result is not None else None)
+
+    for idx, result in sorted(plan.results.items()):
+        finish(idx, result)
+
+    async def search_one(idx, keyword, max_pages):
+        async with semaphore:
+            if cancel_event and cancel_event.is_set():
+                return
+            result = await search_product_by_keywords(
+                nm_id, keyword, keyword_idx=idx, total_keywords=len(keywords), cancel_event=cancel_event,
+                max_pages=max_pages, **kwargs
+            )
+        finish(idx, result)
+
+    await asyncio.gather(*(search_one(idx, keyword, max_pages) for idx, keyword, max_pages in plan.scans))
+    return results
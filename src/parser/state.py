@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import secrets
+from abc import ABC, abstractmethod
+import time
+from collections import deque
+from urllib.parse import urlsplit
+from .config import STATE_BACKEND_URL, STATE_TIMEOUT
+from .metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+class RespError(Exception):
+    """Ошибка, которую вернул Redis (ответ "-ERR ...")."""
+
+# Ошибки общего хранилища, при которых вызывающий код продолжает работу без него
+STATE_ERRORS = (OSError, EOFError, asyncio.TimeoutError, RespError)
+
+# Удаление ключа, только если в нем все еще наш токен (снятие блокировки)
+RELEASE_SCRIPT = 'if redis.call("get", KEYS[1]) == ARGV[1] then return redis.call("del", KEYS[1]) else return 0 end'
+# Продление срока ключа, только если в нем все еще наш токен (продление блокировки)
+RENEW_SCRIPT = 'if redis.call("get", KEYS[1]) == ARGV[1] then return redis.call("pexpire", KEYS[1], ARGV[2]) else return 0 end'
+
+def _to_bytes(value):
+    return value.encode() if isinstance(value, str) else bytes(value)
+
+class StateBackend(ABC):
+    """Общее состояние реплик бота: задания, сигналы отмены, блокировки и общие кэши.
+
+    Значения - строки или байты, get возвращает байты. ttl задается в
+    секундах. shared показывает, видят ли состояние другие процессы:
+    при локальном хранилище вызывающий код может не дублировать в нем то,
+    что и так хранит в памяти.
+    """
+
+    shared = False
+
+    @abstractmethod
+    async def get(self, key):
+        """Значение ключа (bytes) или None."""
+
+    @abstractmethod
+    async def set(self, key, value, ttl=None):
+        """Записывает значение; без ttl ключ не истекает."""
+
+    @abstractmethod
+    async def delete(self, key):
+        """Удаляет ключ, если он есть."""
+
+    @abstractmethod
+    async def set_if_absent(self, key, value, ttl):
+        """Записывает значение, только если ключа нет; возвращает True при записи."""
+
+    @abstractmethod
+    async def delete_if_equals(self, key, value):
+        """Удаляет ключ, только если в нем value; возвращает True при удалении."""
+
+    @abstractmethod
+    async def expire_if_equals(self, key, value, ttl):
+        """Продлевает срок ключа до ttl секунд, только если в нем value; возвращает True при продлении."""
+
+    async def acquire_lock(self, name, ttl):
+        """Берет блокировку на ttl секунд; возвращает токен для снятия или None, если она занята."""
+        token = secrets.token_hex(8)
+        if await self.set_if_absent(f"lock:{name}", token, ttl):
+            return token
+        return None
+
+    async def release_lock(self, name, token):
+        """Снимает блокировку, если она все еще принадлежит token (не истекла и не перехвачена)."""
+        return await self.delete_if_equals(f"lock:{name}", token)
+
+    async def renew_lock(self, name, token, ttl):
+        """Продлевает блокировку на ttl секунд; False, если она уже истекла или перехвачена."""
+        return await self.expire_if_equals(f"lock:{name}", token, ttl)
+
+    async def close(self):
+        pass
+
+    def stats(self):
+        return {}
+
+class MemoryBackend(StateBackend):
+    """Состояние в памяти процесса: для запуска в одном экземпляре."""
+
+    def __init__(self):
+        self._data = {}  # key -> (value, expires_at или None)
+        self._sets = 0
+
+    def _get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry[0]
+
+    def _set(self, key, value, ttl):
+        self._data[key] = (_to_bytes(value), time.time() + ttl if ttl else None)
+        self._sets += 1
+        if self._sets % 1000 == 0:
+            self._purge_expired()
+
+    def _purge_expired(self):
+        now = time.time()
+        for key in [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]:
+            del self._data[key]
+
+    async def get(self, key):
+        return self._get(key)
+
+    async def set(self, key, value, ttl=None):
+        self._set(key, value, ttl)
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+
+    async def set_if_absent(self, key, value, ttl):
+        if self._get(key) is not None:
+            return False
+        self._set(key, value, ttl)
+        return True
+
+    async def delete_if_equals(self, key, value):
+        if self._get(key) != _to_bytes(value):
+            return False
+        del self._data[key]
+        return True
+
+    async def expire_if_equals(self, key, value, ttl):
+        if self._get(key) != _to_bytes(value):
+            return False
+        self._data[key] = (self._data[key][0], time.time() + ttl)
+        return True
+
+    def stats(self):
+        return {"keys": len(self._data)}
+
+def encode_command(args):
+    """Кодирует команду в протокол RESP: массив bulk-строк."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = _to_bytes(arg if isinstance(arg, (str, bytes, bytearray)) else str(arg))
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+async def read_reply(reader):
+    """Читает один ответ RESP. Ошибка Redis возвращается как RespError, а не выбрасывается."""
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by state backend")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload
+    if kind == b"-":
+        return RespError(payload.decode(errors="replace"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        count = int(payload)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise ConnectionError(f"Unexpected RESP reply: {line[:50]!r}")
+
+class RedisBackend(StateBackend):
+    """Состояние в Redis (или совместимом сервере): общее для всех реплик.
+
+    Минимальный клиент RESP поверх одного соединения с конвейерной
+    обработкой: команды пишутся сразу, ответы разбираются фоновой задачей
+    по порядку, поэтому одновременные вызовы не ждут друг друга. При
+    разрыве соединения ожидающие команды завершаются ошибкой, следующая
+    команда подключается заново.
+    """
+
+    shared = True
+
+    def __init__(self, url, timeout=STATE_TIMEOUT):
+        parsed = urlsplit(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._pending = deque()  # Futures команд в порядке отправки
+        self._connecting = None
+        self.commands = 0
+        self.errors = 0
+        self.connects = 0
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self._reader, self._writer = reader, writer
+        self._read_task = asyncio.ensure_future(self._read_loop(reader))
+        try:
+            if self.password:
+                await self._send(("AUTH", self.password))
+            if self.db:
+                await self._send(("SELECT", self.db))
+        except BaseException:
+            # Соединение без авторизации или не с той базой не должно использоваться следующими командами
+            self._read_task.cancel()
+            self._disconnect(ConnectionError("State backend handshake failed"))
+            raise
+        self.connects += 1
+        logger.info("Connected to state backend %s:%s/%s", self.host, self.port, self.db)
+
+    async def _ensure_connected(self):
+        if self._writer is not None and not self._writer.is_closing():
+            return
+        # Одно подключение на всех ожидающих, а не по одному на каждую команду
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._connect())
+        connecting = self._connecting
+        try:
+            await asyncio.shield(connecting)
+        finally:
+            if self._connecting is connecting and connecting.done():
+                self._connecting = None
+
+    def _send(self, args):
+        if self._writer is None:
+            raise ConnectionError("State backend is not connected")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        self._writer.write(encode_command(args))
+        return future
+
+    async def execute(self, *args):
+        """Выполняет команду и возвращает ответ (bytes, int, None или список)."""
+        self.commands += 1
+        try:
+            await asyncio.wait_for(self._ensure_connected(), self.timeout)
+            return await asyncio.wait_for(self._send(args), self.timeout)
+        except STATE_ERRORS:
+            self.errors += 1
+            raise
+
+    async def _read_loop(self, reader):
+        try:
+            while True:
+                reply = await read_reply(reader)
+                future = self._pending.popleft()
+                if future.done():
+                    continue  # Команда уже завершилась по таймауту
+                if isinstance(reply, RespError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except (OSError, EOFError, ValueError, IndexError) as e:
+            if self._reader is reader:
+                logger.error("State backend connection lost: %s", e)
+                self._disconnect(ConnectionError(f"State backend connection lost: {e}"))
+        except asyncio.CancelledError:
+            # Соединение могло быть уже заменено новым - его не трогаем
+            if self._reader is reader:
+                self._disconnect(ConnectionError("State backend connection closed"))
+            raise
+
+    def _disconnect(self, error):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def get(self, key):
+        return await self.execute("GET", key)
+
+    async def set(self, key, value, ttl=None):
+        if ttl:
+            await self.execute("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            await self.execute("SET", key, value)
+
+    async def delete(self, key):
+        await self.execute("DEL", key)
+
+    async def set_if_absent(self, key, value, ttl):
+        return await self.execute("SET", key, value, "NX", "PX", int(ttl * 1000)) is not None
+
+    async def delete_if_equals(self, key, value):
+        return await self.execute("EVAL", RELEASE_SCRIPT, 1, key, value) == 1
+
+    async def expire_if_equals(self, key, value, ttl):
+        return await self.execute("EVAL", RENEW_SCRIPT, 1, key, value, int(ttl * 1000)) == 1
+
+    async def close(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+            await asyncio.gather(self._read_task, return_exceptions=True)
+            self._read_task = None
+        self._disconnect(ConnectionError("State backend connection closed"))
+
+    def stats(self):
+        return {"commands": self.commands, "errors": self.errors, "connects": self.connects, "pending": len(self._pending)}
+
+def create_backend(url):
+    """Создает хранилище по адресу: memory:// или redis://[:пароль@]хост[:порт][/база]."""
+    scheme = urlsplit(url).scheme
+    if scheme in ("", "memory"):
+        return MemoryBackend()
+    if scheme == "redis":
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported STATE_BACKEND_URL scheme: {scheme}")
+
+_backend = None
+
+def get_state_backend():
+    """Возвращает общее хранилище состояния по STATE_BACKEND_URL (создается лениво)."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(STATE_BACKEND_URL)
+        register_stats("state", _backend.stats)
+        logger.info("Using %s state backend", type(_backend).__name__)
+    return _backend
+
+async def close_state_backend():
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
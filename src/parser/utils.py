@@ -1,13 +1,15 @@
+import logging
 import re
-from .config import logger
+
+logger = logging.getLogger(__name__)
 
 def extract_product_id(url):
     """Извлекает ID товара из URL."""
-    logger.info(f"Extracting product ID from URL: {url}")
+    logger.info("Extracting product ID from URL: %s", url)
     match = re.search(r'/catalog/(\d+)/detail\.aspx', url)
     if match:
         nm_id = int(match.group(1))
-        logger.info(f"Extracted nm_id={nm_id}")
+        logger.info("Extracted nm_id=%s", nm_id)
         return nm_id
     logger.error("No product ID found in URL")
     return None
\ No newline at end of file
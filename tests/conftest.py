@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Тесты импортируют пакеты из src; логи только в консоль
+os.environ.setdefault("LOG_DIR", "")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,48 @@
+import asyncio
+import time
+from aiohttp import web
+from parser import http
+
+async def serve_slow(delay):
+    """Локальный сервер, отвечающий на любой запрос через delay секунд; возвращает (runner, url)."""
+    async def handler(request):
+        await asyncio.sleep(delay)
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/slow"
+
+def fetch_with_timeouts(monkeypatch, delay, session_timeout, **kwargs):
+    """Запрашивает медленный сервер; возвращает (исключение или None, секунды)."""
+    monkeypatch.setattr(http, "HTTP_TIMEOUT", session_timeout)
+
+    async def run():
+        runner, url = await serve_slow(delay)
+        start = time.perf_counter()
+        error = None
+        try:
+            await http.fetch_json(url, retries=0, **kwargs)
+        except http.HTTP_ERRORS as e:
+            error = e
+        elapsed = time.perf_counter() - start
+        await http.close_session()
+        await runner.shutdown()
+        return error, elapsed
+
+    return asyncio.run(run())
+
+def test_fetch_json_uses_default_timeout(monkeypatch):
+    error, elapsed = fetch_with_timeouts(monkeypatch, delay=3, session_timeout=0.3)
+    assert isinstance(error, asyncio.TimeoutError)
+    assert elapsed < 2
+
+def test_fetch_json_explicit_timeout(monkeypatch):
+    error, elapsed = fetch_with_timeouts(monkeypatch, delay=3, session_timeout=30, timeout=0.3)
+    assert isinstance(error, asyncio.TimeoutError)
+    assert elapsed < 2
@@ -0,0 +1,41 @@
+"""Проверки того, что процессы пула и пакетный режим не загружают бота.
+
+Каждая проверка выполняется в новом интерпретаторе: в текущем модули уже
+могут быть загружены другими тестами.
+"""
+import json
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Импорт parser.search и parser.parser в новом процессе занимает десятые доли секунды;
+# предел с запасом на медленные машины CI, но меньше времени загрузки aiogram и pymorphy2
+IMPORT_TIME_LIMIT = 3.0
+
+# Выражение для подпроцесса: загруженные модули бота, aiogram и pymorphy2
+HEAVY_MODULES = "sorted(name for name in sys.modules if name.split('.')[0] in ('aiogram', 'bot', 'pymorphy2'))"
+
+def run_python(code):
+    env = dict(os.environ, PYTHONPATH=SRC_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""), LOG_DIR="")
+    env.setdefault("TELEGRAM_TOKEN", "0:test")  # Чтобы ошибочный импорт бота проявился списком модулей, а не ошибкой конфигурации
+    output = subprocess.run([sys.executable, "-c", code], env=env, cwd=SRC_DIR, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def test_parser_import_is_light():
+    result = run_python(
+        "import json, sys, time; start = time.perf_counter(); import parser.search, parser.parser; "
+        f"print(json.dumps([time.perf_counter() - start, {HEAVY_MODULES}]))"
+    )
+    elapsed, heavy = result
+    assert heavy == []
+    assert elapsed < IMPORT_TIME_LIMIT
+
+def test_keyword_worker_does_not_import_bot():
+    # Так процесс пула (spawn) загружает __main__ родителя перед выполнением заданий
+    result = run_python(
+        "import json, runpy, sys; runpy.run_path('main.py', run_name='__mp_main__'); import parser.executor; "
+        f"print(json.dumps({HEAVY_MODULES}))"
+    )
+    assert result == []